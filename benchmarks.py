@@ -0,0 +1,730 @@
+"""
+Benchmarks, simulations and stress tests for the time tracker.
+
+Everything here drives the code in time_tracker.py with synthetic history, scripted
+clocks and samplers; none of it is needed to run the app.
+
+Usage:
+python benchmarks.py bench sampler    # resource sampler CPU budget check
+python benchmarks.py simulate         # replay a scripted week on a virtual clock
+python benchmarks.py stress           # hammer the tracker from several threads
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import psutil
+
+from time_tracker import (
+    ARCHIVE_DIR, AUTOSAVE_SECONDS, HISTORY_PAGE_DAYS, IDLE_THRESHOLD_SECONDS, RESOURCE_CPU_BUDGET,
+    SAMPLE_INTERVAL_SECONDS, TICK_MAX_CREDIT_SECONDS, ActivityTimeline, IdleSource, ResourceSampler,
+    SessionTracker, SystemClock, TaskEstimator, WindowClassifier, WindowSampler, add_resource_sample,
+    archive_cutoff, archive_sessions, connect_db, fetch_reports, focus_stats, focus_summary, get_classifier,
+    init_database, load_focus_samples, merge_databases, record_task_stats, refresh_daily_rollup,
+    render_batch_report, render_timeline_svg, task_key,
+)
+
+
+# --- Test Doubles ---
+class FakeIdleSource(IdleSource):
+    """Idle source driven by hand, for tests and simulations"""
+
+    def __init__(self, idle=0.0):
+        self.idle = idle
+
+    def idle_seconds(self):
+        return self.idle
+
+
+class VirtualClock(SystemClock):
+    """Clock that only moves when told to, so simulated days pass in milliseconds"""
+
+    def __init__(self, start):
+        self._now = start
+        self._elapsed = 0.0
+
+    def now(self):
+        return self._now
+
+    def monotonic(self):
+        return self._elapsed
+
+    def wait(self, seconds, wake):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        self._now += timedelta(seconds=seconds)
+        self._elapsed += seconds
+
+
+class ScaledClock(SystemClock):
+    """
+    Real clock running speed times faster, for stress tests with real threads.
+    It also adds up how long the session was running, independently of the tracker.
+    """
+
+    def __init__(self, speed):
+        self.speed = speed
+        self._start = datetime.now()
+        self._base = time.monotonic()
+        self._last_reading = 0.0
+        self._running_since = None
+        self.running_seconds = 0.0
+
+    def now(self):
+        return self._start + timedelta(seconds=self.monotonic())
+
+    def monotonic(self):
+        self._last_reading = (time.monotonic() - self._base) * self.speed
+        return self._last_reading
+
+    def set_running(self, running):
+        """Mark the session running or stopped as of the reading the tracker just took"""
+        if self._running_since is not None:
+            self.running_seconds += self._last_reading - self._running_since
+        self._running_since = self._last_reading if running else None
+
+    def wait(self, seconds, wake):
+        super().wait(seconds / self.speed, wake)
+
+
+class ScriptedWindowSampler(WindowSampler):
+    """Window sampler whose title is set by a test or simulation"""
+
+    def __init__(self, title=None):
+        self.title = title
+
+    def active_title(self):
+        return self.title
+
+
+# --- Synthetic History ---
+# Roughly the size of a real session report
+SYNTHETIC_REPORT_HTML = '<html><body>' + '<div class="task-card">synthetic</div>' * 300 + '</body></html>'
+
+
+def generate_synthetic_history(db_path, days, sessions_per_day=3, tasks_per_session=4, samples_per_task=60, start_day=None):
+    """Fill a database with plausible made-up sessions for benchmarks and simulations"""
+    init_database(db_path)
+    start_day = start_day or datetime.now().date() - timedelta(days=days)
+    titles = [f"{doc} - {app}" for app in ('Visual Studio Code', 'Google Chrome', 'Slack', 'Microsoft Teams', 'Outlook')
+              for doc in ('main.py', 'Inbox', 'Standup', 'Design doc', 'Sprint board', 'Release notes')]
+    task_names = ['Code review', 'Feature work', 'Email', 'Meetings', 'Planning', 'Bug triage', 'Docs']
+    classifier = get_classifier()
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        cursor = conn.cursor()
+        session_id = cursor.execute('SELECT COALESCE(MAX(id), 0) FROM sessions').fetchone()[0]
+        task_id = cursor.execute('SELECT COALESCE(MAX(id), 0) FROM session_tasks').fetchone()[0]
+        sessions, tasks, samples, subtasks, reports = [], [], [], [], []
+        for day in range(days):
+            for n in range(sessions_per_day):
+                session_id += 1
+                start = datetime.combine(start_day + timedelta(days=day), datetime.min.time()) + timedelta(hours=8 + 3 * n)
+                sessions.append((session_id, tasks_per_session * 30, start, start + timedelta(hours=2)))
+                reports.append((session_id, start.date(), SYNTHETIC_REPORT_HTML, tasks_per_session * 30, 100.0, tasks_per_session))
+                for position in range(tasks_per_session):
+                    task_id += 1
+                    name = task_names[(session_id + position) % len(task_names)]
+                    tasks.append((task_id, session_id, position, name, 30, 1500 + (task_id * 37) % 900, True))
+                    subtasks.append((task_id, 0, f"{name} checklist", task_id % 2 == 0))
+                    task_start = start + timedelta(minutes=30 * position)
+                    for k in range(samples_per_task):
+                        title = titles[(task_id * 7 + k // 6) % len(titles)]
+                        samples.append((task_id, task_start + timedelta(seconds=SAMPLE_INTERVAL_SECONDS * k),
+                                        title, classifier.classify(title)))
+        cursor.executemany('INSERT INTO sessions (id, total_minutes, start_time, end_time, closed) VALUES (?, ?, ?, ?, 1)', sessions)
+        cursor.executemany('INSERT INTO session_tasks (id, session_id, position, task_name, planned_minutes, actual_seconds, completed) VALUES (?, ?, ?, ?, ?, ?, ?)', tasks)
+        cursor.executemany('INSERT INTO sub_tasks (session_task_id, position, name, completed) VALUES (?, ?, ?, ?)', subtasks)
+        cursor.executemany('INSERT OR IGNORE INTO window_titles (title) VALUES (?)', [(title,) for title in titles])
+        title_ids = dict(cursor.execute('SELECT title, id FROM window_titles'))
+        cursor.executemany('INSERT INTO window_samples (session_task_id, timestamp, title, category, title_id) VALUES (?, ?, ?, ?, ?)',
+                           [sample + (title_ids[sample[2]],) for sample in samples])
+        cursor.executemany('''
+            INSERT INTO daily_reports (session_id, report_date, report_html, total_planned_minutes, total_actual_minutes, tasks_count)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', reports)
+    conn.close()
+
+    conn = connect_db(db_path)
+    with conn:
+        refresh_daily_rollup(conn)
+    conn.close()
+
+
+# --- Benchmarks ---
+def benchmark_sampler(args):
+    """Run the sampler against real processes and report its CPU share of one core"""
+    pids = psutil.pids()
+    # Pretend the foreground window moves to another process every 5 seconds
+    sampler = ResourceSampler(pid_source=lambda: pids[int(time.monotonic() / 5) % len(pids)])
+
+    wall_start = time.monotonic()
+    cpu_start = time.process_time()
+    usage = {}
+    while time.monotonic() - wall_start < args.seconds:
+        now = time.monotonic()
+        if sampler.due(now):
+            result = sampler.sample(now)
+            if result:
+                add_resource_sample(usage, *result)
+        time.sleep(1)
+
+    wall = time.monotonic() - wall_start
+    cpu = time.process_time() - cpu_start
+    print(f"samples:           {sampler.samples_taken}")
+    print(f"adaptive interval: {sampler.interval:.2f} s")
+    print(f"sampler cpu:       {sampler.cpu_used * 1000:.1f} ms ({sampler.cpu_used / wall:.4%} of one core)")
+    print(f"process cpu:       {cpu * 1000:.1f} ms ({cpu / wall:.4%} of one core, incl. loop overhead)")
+    print(f"budget:            {RESOURCE_CPU_BUDGET:.2%} of one core -> {'OK' if sampler.cpu_used / wall <= RESOURCE_CPU_BUDGET else 'EXCEEDED'}")
+
+
+def hot_path_timings(db_path, today, repeat=5):
+    """Best-of timings in ms for startup, the first History page and closing a session"""
+    def best(func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000
+
+    conn = connect_db(db_path)
+
+    def close_session():
+        refresh_daily_rollup(conn, today)
+        conn.rollback()
+
+    result = {
+        'startup': best(lambda: init_database(db_path)),
+        'history page': best(lambda: fetch_reports(conn, today - timedelta(days=HISTORY_PAGE_DAYS - 1), today)),
+        'session close': best(close_session),
+    }
+    conn.close()
+    return result
+
+
+def benchmark_archive(args):
+    """Compare hot-path latency and file size with and without monthly archives as history grows"""
+    today = datetime.now().date()
+    for years in (1, 2, 4):
+        with tempfile.TemporaryDirectory() as tmp:
+            single = os.path.join(tmp, 'single.db')
+            archived = os.path.join(tmp, 'archived.db')
+            generate_synthetic_history(single, days=365 * years, samples_per_task=20)
+            shutil.copy(single, archived)
+            started = time.perf_counter()
+            moved = archive_sessions(archived, archive_cutoff(today))
+            archiving = time.perf_counter() - started
+
+            for label, path in (('single file', single), ('archived', archived)):
+                timings = hot_path_timings(path, today)
+                print(f"years={years} {label:<12} size={os.path.getsize(path) / 2**20:6.1f} MB "
+                      + ' '.join(f"{name}={ms:.2f}ms" for name, ms in timings.items()))
+            print(f"years={years} archived {moved} sessions into {len(os.listdir(os.path.join(tmp, ARCHIVE_DIR)))} "
+                  f"monthly files in {archiving:.1f}s")
+
+
+def benchmark_merge(args):
+    """Merge three machines' years of history, one overlapping another, then merge them again"""
+    with tempfile.TemporaryDirectory() as tmp:
+        today = datetime.now().date()
+        sources = []
+        for name, start_hour_shift in (('laptop', 0), ('desktop', 1), ('server', 2)):
+            path = os.path.join(tmp, f'{name}.db')
+            generate_synthetic_history(path, days=365, sessions_per_day=1, samples_per_task=60, start_day=today - timedelta(days=365))
+            conn = sqlite3.connect(path)
+            with conn:
+                conn.execute("UPDATE sessions SET start_time = datetime(start_time, ?)", (f'+{start_hour_shift * 3} hours',))
+            conn.close()
+            sources.append(path)
+        # The server already holds a merge of the laptop
+        merge_databases(sources[2], [sources[0]])
+
+        target = os.path.join(tmp, 'combined.db')
+        for run in ('first', 'again'):
+            started = time.perf_counter()
+            merged, duplicates, _ = merge_databases(target, sources)
+            elapsed = time.perf_counter() - started
+            conn = sqlite3.connect(target)
+            sessions = conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+            samples = conn.execute('SELECT COUNT(*) FROM window_samples').fetchone()[0]
+            conn.close()
+            print(f"{run:<6} merged={merged} duplicates={duplicates} time={elapsed:.2f}s "
+                  f"sessions in main={sessions} samples in main={samples} archives={len(os.listdir(os.path.join(tmp, ARCHIVE_DIR)))}")
+
+
+def benchmark_estimator(args):
+    """Compare a full statistics build with the per-session update, and time prefix lookups"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        generate_synthetic_history(db_path, days=365, sessions_per_day=3)
+        conn = sqlite3.connect(db_path)
+        with conn:
+            started = time.perf_counter()
+            record_task_stats(conn, 's.closed')
+            full = time.perf_counter() - started
+            session_ids = [row[0] for row in conn.execute('SELECT id FROM sessions ORDER BY id DESC LIMIT 100')]
+            started = time.perf_counter()
+            for session_id in session_ids:
+                record_task_stats(conn, 's.id = ?', (session_id,))
+            incremental = (time.perf_counter() - started) / len(session_ids)
+            sessions = conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+        conn.close()
+        print(f"build from {sessions} sessions={full * 1000:.1f}ms update on close={incremental * 1000:.2f}ms")
+
+    rng = random.Random(0)
+    words = ['review', 'planning', 'email', 'release', 'bug', 'triage', 'docs', 'meeting', 'design', 'support']
+    rows = [(task_key(name), name, rng.randint(1, 50), 1800.0, 1800.0, '{"79": 1}')
+            for name in {' '.join(rng.sample(words, 3)) + f" {n}" for n in range(10_000)}]
+    estimator = TaskEstimator(rows)
+    prefixes = [name[:length] for _, name, *_ in rows[:1000] for length in range(1, 12)]
+    started = time.perf_counter()
+    for prefix in prefixes:
+        estimator.suggest(prefix)
+    elapsed = time.perf_counter() - started
+    print(f"names={len(rows)} keystrokes={len(prefixes)} suggest={elapsed / len(prefixes) * 1e6:.1f} µs per keystroke")
+
+
+def benchmark_classifier(args):
+    """Classify 1M titles against 500 rules, cold and through the LRU cache"""
+    rng = random.Random(42)
+    apps = ['Visual Studio Code', 'Google Chrome', 'Slack', 'Microsoft Teams', 'Outlook', 'Notepad', 'Terminal']
+    rules = []
+    for i in range(500):
+        if i % 25 == 0:
+            rules.append({"match": "regex", "pattern": rf"\bTICKET-{i}\d*\b", "category": f"ticket {i}"})
+        elif i % 5 == 0:
+            rules.append({"match": "glob", "pattern": f"*project-{i}*- {apps[i % len(apps)]}", "category": f"project {i}"})
+        else:
+            rules.append({"match": "substring", "pattern": f"client-{i} ", "category": f"client {i}"})
+
+    distinct = [f"{rng.choice(['notes', 'TICKET-75', 'client-%d ' % rng.randrange(600), 'project-%d' % rng.randrange(600)])} "
+                f"draft {n} - {rng.choice(apps)}" for n in range(50_000)]
+    # Real sessions revisit the same few windows; draw with a heavy head like a Zipf distribution
+    weights = [1 / (rank + 1) for rank in range(len(distinct))]
+    titles = rng.choices(distinct, weights=weights, k=1_000_000)
+
+    classifier = WindowClassifier(rules)
+    cold = distinct[:20_000]
+    started = time.perf_counter()
+    for title in cold:
+        classifier.classify_uncached(title)
+    cold_us = (time.perf_counter() - started) / len(cold) * 1e6
+
+    started = time.perf_counter()
+    classify = classifier.classify
+    for title in titles:
+        classify(title)
+    elapsed = time.perf_counter() - started
+    info = classifier.classify.cache_info()
+
+    print(f"rules:            {len(rules)}")
+    print(f"uncached:         {cold_us:.1f} us/title")
+    print(f"1M titles:        {elapsed:.2f} s ({elapsed / len(titles) * 1e6:.2f} us/title)")
+    print(f"cache hit rate:   {info.hits / (info.hits + info.misses):.1%}")
+
+
+def benchmark_timeline(args):
+    """Show that timeline size and render time do not depend on the number of samples"""
+    start = datetime(2026, 1, 5, 9, 0)
+    categories = ['IDE', 'browser', 'chat', 'email', 'meetings']
+    for sample_count in (1_000, 1_000_000):
+        timeline = ActivityTimeline(start)
+        span = 10 * 3600
+        started = time.perf_counter()
+        for n in range(sample_count):
+            when = start + timedelta(seconds=n * span / sample_count)
+            timeline.record('task', when, f"task:{(n * 8 // sample_count)}")
+            timeline.record('window', when, categories[(n // max(1, sample_count // 400)) % len(categories)])
+        recorded = time.perf_counter() - started
+
+        started = time.perf_counter()
+        svg = render_timeline_svg(timeline.to_dict())
+        rendered = time.perf_counter() - started
+        print(f"samples={sample_count:<9} record={recorded:.2f}s render={rendered * 1000:.1f}ms "
+              f"svg={len(svg) / 1024:.1f} KB rects={svg.count('<rect')}")
+
+
+def benchmark_focus(args):
+    """Load a year of synthetic window samples into arrays and compute focus statistics for every task"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        generate_synthetic_history(db_path, days=365, samples_per_task=180)
+        end_day = datetime.now().date()
+        conn = connect_db(db_path)
+        for _ in range(2):
+            started = time.perf_counter()
+            samples = load_focus_samples(conn, end_day - timedelta(days=366), end_day)
+            loaded = time.perf_counter() - started
+            started = time.perf_counter()
+            per_task, total = focus_stats(samples)
+            computed = time.perf_counter() - started
+        conn.close()
+        print(f"samples={len(samples)} tasks={len(per_task)} load={loaded * 1000:.0f}ms compute={computed * 1000:.0f}ms "
+              f"total={(loaded + computed) * 1000:.0f}ms")
+        print(f"all tasks: {focus_summary(total)}")
+
+
+def benchmark_batch_report(args):
+    """Render a year of synthetic sessions with 1..N workers and report the speedup"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        generate_synthetic_history(db_path, days=365, sessions_per_day=3)
+        start_day, end_day = datetime.now().date() - timedelta(days=366), datetime.now().date()
+
+        max_workers = os.cpu_count() or 1
+        worker_counts = sorted({1, 2, 4, max_workers} & set(range(1, max_workers + 1)))
+        baseline = None
+        for workers in worker_counts:
+            out_path = os.path.join(tmp, f'report_{workers}.html')
+            started, parent_started = time.perf_counter(), time.process_time()
+            count = render_batch_report(db_path, start_day, end_day, out_path, workers=workers)
+            elapsed, parent = time.perf_counter() - started, time.process_time() - parent_started
+            baseline = baseline or elapsed
+            # The parent's own CPU time is the serial part that bounds the speedup more workers can give
+            print(f"workers={workers:<3} sessions={count} time={elapsed:.2f}s speedup={baseline / elapsed:.2f}x "
+                  f"parent cpu={parent:.2f}s size={os.path.getsize(out_path) / 2**20:.1f} MB")
+
+
+BENCHMARKS = {
+    'sampler': benchmark_sampler,
+    'batch-report': benchmark_batch_report,
+    'classifier': benchmark_classifier,
+    'timeline': benchmark_timeline,
+    'estimator': benchmark_estimator,
+    'focus': benchmark_focus,
+    'merge': benchmark_merge,
+    'archive': benchmark_archive,
+}
+
+
+# --- Simulation ---
+SIMULATION_TITLES = [f"{doc} - {app}" for app in ('Visual Studio Code', 'Google Chrome', 'Slack', 'Outlook', 'Zoom')
+                     for doc in ('main.py', 'Inbox', 'Standup', 'Design doc', 'Sprint board')]
+
+
+class SimulatedTracker(SessionTracker):
+    """SessionTracker whose keep/discard answers for idle spans come from the scenario script"""
+
+    keep_idle = False
+    span_keep = False
+
+    def on_idle_start(self):
+        # The answer belongs to the span that is starting, not to whatever the script does next
+        self.span_keep = self.keep_idle
+
+    def on_idle_return(self, task_index, idle_span, counted):
+        self.resolve_idle_span(task_index, idle_span, counted, keep=self.span_keep)
+
+
+def simulation_script(rng, task_count, hours):
+    """Random but reproducible segments for one session: (kind, task index, seconds, keep)"""
+    segments = []
+    remaining = int(hours * 3600)
+    task_index = 0
+    while remaining > 0:
+        roll = rng.random()
+        if roll < 0.08:
+            kind, seconds = 'pause', rng.randint(60, 1800)
+        elif roll < 0.16:
+            kind, seconds = 'away', rng.randint(IDLE_THRESHOLD_SECONDS + 60, 3600)
+        else:
+            kind, seconds = 'work', rng.randint(30, 1500)
+            if rng.random() < 0.7:
+                task_index = rng.randrange(task_count)
+        seconds = min(seconds, remaining)
+        segments.append((kind, task_index, seconds, rng.random() < 0.5))
+        remaining -= seconds
+    return segments
+
+
+def simulate_session(tracker, clock, idle, windows, rng, segments, jitter, crash_at=None):
+    """
+    Drive one scripted session tick by tick on the virtual clock.
+    Returns the seconds each task should have been credited and whether the script ran to the end.
+    """
+    expected = [0.0] * len(tracker.tasks)
+    worked = 0
+    for kind, task_index, seconds, keep in segments:
+        if kind == 'pause' and tracker.is_running or kind != 'pause' and not tracker.is_running:
+            tracker.toggle_pause()
+        if kind == 'work':
+            tracker.switch_to_task(task_index)
+        tracker.keep_idle = keep
+        windows.title = rng.choice(SIMULATION_TITLES)
+
+        segment_end = clock.monotonic() + seconds
+        away_since = clock.monotonic()
+        while clock.monotonic() < segment_end:
+            idle.idle = clock.monotonic() - away_since if kind == 'away' else 0.0
+            step = tracker.tick()
+            step = min(step * (1 + rng.random() * jitter), segment_end - clock.monotonic())
+            if kind == 'work' or kind == 'away' and keep:
+                expected[tracker.current_task_index] += step
+            clock.advance(step)
+            worked += step
+            # Crash while working; during an away span the outcome would hinge on an answer never given
+            if crash_at is not None and worked >= crash_at and kind == 'work':
+                return expected, False
+    idle.idle = 0.0
+    tracker.tick()
+    return expected, True
+
+
+def run_simulation(args):
+    """
+    Replay a scripted week of sessions on a virtual clock, thousands of times faster
+    than real time, and check timing accuracy, memory growth and database size.
+    Exits non-zero when a check fails.
+    """
+    import tracemalloc
+
+    rng = random.Random(args.seed)
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'simulation.db')
+    clock = VirtualClock(datetime(2026, 1, 5, 9, 0))
+    idle = FakeIdleSource()
+    windows = ScriptedWindowSampler()
+
+    def new_tracker():
+        return SimulatedTracker(db_path, clock=clock, idle_source=idle, window_sampler=windows,
+                                resource_sampler=ResourceSampler(pid_source=lambda: None))
+
+    tracemalloc.start()
+    tracker = new_tracker()
+    failures = []
+    memory = []
+    sizes = []
+    started = time.perf_counter()
+    simulated = 0.0
+
+    for day in range(args.days):
+        day_start = datetime.combine(clock.now().date() + timedelta(days=1 if day else 0), datetime.min.time())
+        # The last day starts in the evening and runs past midnight; one day in the middle crashes
+        midnight = day == args.days - 1
+        crash = day == args.days // 2
+        start = day_start + timedelta(hours=20 if midnight else 9, minutes=rng.randrange(60))
+        clock.advance((start - clock.now()).total_seconds())
+
+        task_count = rng.randint(6, 12)
+        tasks = [{'name': f"Task {n + 1}", 'minutes': rng.choice((15, 30, 45, 60)), 'actual_seconds': 0, 'subtasks': []}
+                 for n in range(task_count)]
+        hours = 6 if midnight else rng.uniform(7, 10)
+        segments = simulation_script(rng, task_count, hours)
+        clock_started = clock.monotonic()
+        tracker.start_session(tasks, sum(task['minutes'] for task in tasks), clock.now() + timedelta(hours=hours))
+        session_id, session_day = tracker.session_id, tracker.session_start_time.date()
+        expected, finished = simulate_session(tracker, clock, idle, windows, rng, segments, args.jitter,
+                                              crash_at=hours * 3600 / 2 if crash else None)
+        simulated += clock.monotonic() - clock_started
+
+        if finished:
+            tracker.save_report()
+            tracker.close_session()
+        else:
+            # Lose everything since the last autosave, then start over the way the app would after a restart
+            tracker = new_tracker()
+
+        conn = sqlite3.connect(db_path)
+        stored = [seconds for (seconds,) in conn.execute(
+            'SELECT actual_seconds FROM session_tasks WHERE session_id = ? ORDER BY position', (session_id,))]
+        closed, report_date = conn.execute(
+            'SELECT s.closed, dr.report_date FROM sessions s LEFT JOIN daily_reports dr ON dr.session_id = s.id WHERE s.id = ?',
+            (session_id,)).fetchone()
+        rollup = conn.execute('SELECT session_count FROM daily_rollup WHERE day = ?', (str(session_day),)).fetchone()
+        sample_rows = conn.execute('''
+            SELECT COUNT(*) FROM window_samples ws JOIN session_tasks st ON st.id = ws.session_task_id WHERE st.session_id = ?
+        ''', (session_id,)).fetchone()[0]
+        conn.close()
+
+        error = sum(stored) - sum(expected)
+        # Stopping the clock for a pause or an away span drops under a second carried over from the
+        # last tick; nothing else may be off. A crash may lose up to one autosave interval
+        allowed = 1 + sum(kind != 'work' for kind, *_ in segments)
+        worst = max(abs(s - e) for s, e in zip(stored, expected))
+        label = f"day {day + 1}{' (midnight)' if midnight else ''}{' (crash)' if crash else ''}"
+        print(f"{label:<18} tracked={sum(stored) / 3600:6.2f}h expected={sum(expected) / 3600:6.2f}h "
+              f"error={error:+7.1f}s worst task={worst:6.1f}s segments={len(segments)} samples={sample_rows}")
+
+        if not finished and not -allowed - AUTOSAVE_SECONDS <= error <= allowed:
+            failures.append(f"{label}: tracked time after the crash off by {error:+.0f}s")
+        elif finished and abs(error) > allowed:
+            failures.append(f"{label}: tracked time off by {error:+.0f}s (allowed {allowed}s)")
+        if not closed:
+            failures.append(f"{label}: session was left open")
+        if finished and report_date != str(session_day):
+            failures.append(f"{label}: report filed under {report_date}, expected {session_day}")
+        if not rollup:
+            failures.append(f"{label}: missing from the daily rollup")
+        if finished and sample_rows != sum(len(samples) for samples in tracker.process_tracking.values()):
+            failures.append(f"{label}: {sample_rows} window samples stored for "
+                            f"{sum(len(samples) for samples in tracker.process_tracking.values())} taken")
+
+        memory.append(tracemalloc.get_traced_memory()[0])
+        sizes.append(os.path.getsize(db_path))
+
+    tracemalloc.stop()
+    elapsed = time.perf_counter() - started
+    growth = [after - before for before, after in zip([0] + sizes, sizes)]
+    print(f"simulated {simulated / 3600:.1f}h in {elapsed:.1f}s ({simulated / elapsed:,.0f}x real time)")
+    print(f"memory after each day (KB): {' '.join(f'{m / 1024:.0f}' for m in memory)}")
+    print(f"database growth per day (KB): {' '.join(f'{g / 1024:.0f}' for g in growth)}")
+
+    # Memory should plateau once the first session has warmed caches, not grow with every day
+    if len(memory) > 2 and memory[-1] - memory[1] > 2 * 1024 * 1024:
+        failures.append(f"memory grew by {(memory[-1] - memory[1]) / 1024:.0f} KB after the first day")
+    if max(growth) > 2 * 1024 * 1024:
+        failures.append(f"database grew by {max(growth) / 1024:.0f} KB in one day")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("FAIL" if failures else "PASS")
+    return 1 if failures else 0
+
+
+# --- Stress Test ---
+def run_stress_test(args):
+    """
+    Hammer a tracking thread with switch, pause, subtask and report commands from
+    several threads, on a clock running many times faster than real time, and check
+    that no tracked second is lost or counted twice. Exits non-zero when a check fails.
+    """
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'stress.db')
+    clock = ScaledClock(args.speed)
+    tracker = SessionTracker(db_path, clock=clock, idle_source=FakeIdleSource(),
+                             window_sampler=ScriptedWindowSampler(SIMULATION_TITLES[0]),
+                             resource_sampler=ResourceSampler(pid_source=lambda: None))
+    # The cap is meant for a suspended machine; a thread starved for a few real milliseconds is not one
+    tracker.max_tick_credit_seconds = TICK_MAX_CREDIT_SECONDS * args.speed
+    tasks = [{'name': f"Task {n + 1}", 'minutes': 30, 'actual_seconds': 0, 'subtasks': []} for n in range(8)]
+    tracker.start_session(tasks, 240, clock.now() + timedelta(hours=4))
+    clock.set_running(True)
+    tracker.start_tracking_thread()
+
+    failures = []
+    counts = {}
+    deadline = time.monotonic() + args.seconds
+
+    def checked_report():
+        # Runs on the tracking thread, so the stored totals and the tracker's own count describe the same moment
+        tracker.save_report()
+        conn = sqlite3.connect(db_path)
+        stored = conn.execute('SELECT SUM(actual_seconds) FROM session_tasks WHERE session_id = ?',
+                              (tracker.session_id,)).fetchone()[0]
+        conn.close()
+        return stored, tracker.tracked_seconds
+
+    def toggle_pause():
+        # Runs on the tracking thread right after the tracker read the clock, so both see the same moment
+        tracker.toggle_pause()
+        clock.set_running(tracker.is_running)
+
+    def stop_tracking():
+        tracker.stop_tracking()
+        clock.set_running(False)
+
+    def hammer(seed):
+        rng = random.Random(seed)
+        posted = []
+        while time.monotonic() < deadline:
+            roll = rng.random()
+            if roll < 0.6:
+                posted.append(tracker.post(tracker.switch_to_task, rng.randrange(len(tasks))))
+            elif roll < 0.75:
+                posted.append(tracker.post(toggle_pause))
+            elif roll < 0.8:
+                posted.append(tracker.post(tracker.add_subtask, rng.randrange(len(tasks)), f"step {seed}"))
+            elif roll < 0.98:
+                snapshot = tracker.snapshot
+                if sum(task.actual_seconds for task in snapshot.tasks) != snapshot.tracked_seconds:
+                    failures.append(f"snapshot tasks add up to {sum(task.actual_seconds for task in snapshot.tasks)}s, "
+                                    f"tracked {snapshot.tracked_seconds}s")
+                counts['snapshots'] = counts.get('snapshots', 0) + 1
+            else:
+                stored, tracked = tracker.post(checked_report).result()
+                if stored != tracked:
+                    failures.append(f"report stored {stored}s while {tracked}s were tracked")
+                counts['reports'] = counts.get('reports', 0) + 1
+            # Leave the tracking thread some of the GIL, as a person clicking around would
+            time.sleep(rng.random() * 0.002)
+        for future in posted:
+            future.result()
+        counts['commands'] = counts.get('commands', 0) + len(posted)
+
+    threads = [threading.Thread(target=hammer, args=(n,)) for n in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    tracker.post(stop_tracking)
+    tracker.tracking_thread.join()
+    elapsed = time.perf_counter() - started
+
+    stored, tracked = checked_report()
+    subtasks = sum(len(task['subtasks']) for task in tracker.tasks)
+    conn = sqlite3.connect(db_path)
+    stored_subtasks = conn.execute('''
+        SELECT COUNT(*) FROM sub_tasks JOIN session_tasks st ON st.id = sub_tasks.session_task_id WHERE st.session_id = ?
+    ''', (tracker.session_id,)).fetchone()[0]
+    conn.close()
+    print(f"{args.threads} threads for {elapsed:.1f}s: {counts.get('commands', 0)} commands, "
+          f"{counts.get('reports', 0)} reports, {counts.get('snapshots', 0)} snapshot checks")
+    print(f"tracked {tracked}s of {clock.running_seconds:.1f}s running ({clock.running_seconds / 3600:.1f}h simulated), "
+          f"stored {stored}s, {stored_subtasks} of {subtasks} subtasks stored")
+
+    if stored != tracked:
+        failures.append(f"final report stored {stored}s while {tracked}s were tracked")
+    if stored_subtasks != subtasks:
+        failures.append(f"{stored_subtasks} subtasks stored, {subtasks} added")
+    if not tracked:
+        failures.append("nothing was tracked")
+    # Every second the session ran is counted once; only the fraction still carried to the next tick is missing
+    if abs(clock.running_seconds - tracked) > 1:
+        failures.append(f"tracked {tracked}s while the session ran for {clock.running_seconds:.1f}s")
+
+    for failure in failures[:20]:
+        print(f"FAIL {failure}")
+    print("FAIL" if failures else "PASS")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time tracker benchmarks and simulations")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    bench_parser = subparsers.add_parser('bench', help="Run a performance benchmark")
+    bench_parser.add_argument('name', choices=sorted(BENCHMARKS))
+    bench_parser.add_argument('--seconds', type=float, default=30, help="How long to run time-based benchmarks")
+
+    simulate_parser = subparsers.add_parser('simulate', help="Replay a scripted week on a virtual clock and check the results")
+    simulate_parser.add_argument('--days', type=int, default=7, help="Days to simulate")
+    simulate_parser.add_argument('--seed', type=int, default=0, help="Seed for the scenario script")
+    simulate_parser.add_argument('--jitter', type=float, default=0.1, help="Extra fraction each sleep may oversleep by")
+    simulate_parser.add_argument('--db', help="Database to write (default: a temporary file)")
+
+    stress_parser = subparsers.add_parser('stress', help="Hammer the tracker from several threads and check the accounting")
+    stress_parser.add_argument('--seconds', type=float, default=10, help="How long to run")
+    stress_parser.add_argument('--threads', type=int, default=4, help="Threads posting commands")
+    stress_parser.add_argument('--speed', type=float, default=100, help="How many times faster than real time the clock runs")
+    stress_parser.add_argument('--db', help="Database to write (default: a temporary file)")
+
+    args = parser.parse_args()
+    if args.command == 'bench':
+        BENCHMARKS[args.name](args)
+    elif args.command == 'simulate':
+        sys.exit(run_simulation(args))
+    elif args.command == 'stress':
+        sys.exit(run_stress_test(args))
+
+
+if __name__ == "__main__":
+    main()
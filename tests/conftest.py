@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The tray icon library needs a display unless told to use its no-op backend
+os.environ.setdefault('PYSTRAY_BACKEND', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,32 @@
+import json
+import os
+import sqlite3
+from datetime import date
+
+import benchmarks
+import time_tracker
+
+
+def test_rule_changes_reach_archived_months(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'tracker.db')
+    benchmarks.generate_synthetic_history(db_path, days=40, sessions_per_day=1, tasks_per_session=2,
+                                            samples_per_task=12, start_day=date(2025, 1, 1))
+    assert time_tracker.archive_sessions(db_path, date(2025, 2, 1))
+
+    renamed = time_tracker.WindowClassifier([{'match': 'glob', 'pattern': '*', 'category': 'RENAMED'}])
+    monkeypatch.setattr(time_tracker, '_classifier', renamed)
+    time_tracker.init_database(db_path)
+
+    archive = time_tracker.archive_path(db_path, '2025-01')
+    assert os.path.exists(archive)
+    for path in (db_path, archive):
+        conn = sqlite3.connect(path)
+        categories = {category for (category,) in conn.execute('SELECT DISTINCT category FROM window_samples')}
+        conn.close()
+        assert categories == {'RENAMED'}, path
+
+    conn = sqlite3.connect(db_path)
+    rollup = dict(conn.execute('SELECT day, top_categories FROM daily_rollup'))
+    conn.close()
+    assert {category for value in rollup.values() for category, _ in json.loads(value)} == {'RENAMED'}
+    assert '2025-01-03' in rollup
@@ -0,0 +1,54 @@
+import fnmatch
+import re
+
+import pytest
+
+import time_tracker
+
+RULES = [
+    {'match': 'glob', 'pattern': '[xyz]abc*', 'category': 'set glob'},
+    {'match': 'glob', 'pattern': '[!a]def*', 'category': 'negated glob'},
+    {'match': 'regex', 'pattern': r'(a)\1', 'category': 'A'},
+    {'match': 'regex', 'pattern': r'(b)\1', 'category': 'B'},
+    {'match': 'regex', 'pattern': r'\bTICKET-\d+\b', 'category': 'ticket'},
+    {'match': 'substring', 'pattern': 'Standup', 'category': 'meetings'},
+    {'match': 'substring', 'pattern': 'Stand', 'category': 'standing'},
+    {'match': 'glob', 'pattern': '*Visual Studio Code', 'category': 'IDE'},
+    {'match': 'glob', 'pattern': 'Inbox - ?utlook', 'category': 'email'},
+    {'match': 'glob', 'pattern': '*', 'category': 'anything'},
+]
+
+TITLES = [
+    'xabc - foo', 'aabc - foo', 'qdef - bar', 'adef - bar', 'bb', 'aa', 'TICKET-12 review', 'TICKET-x',
+    'Daily Standup - Teams', 'Stand by', 'main.py - Visual Studio Code', 'Inbox - Outlook', 'inbox - outlook',
+    '', 'Something else',
+]
+
+
+def reference_classify(rules, title):
+    """First rule that plain fnmatch, re.search or a case-insensitive substring test matches"""
+    for rule in rules:
+        kind, pattern = rule['match'], rule['pattern']
+        if (kind == 'substring' and pattern.lower() in title.lower()
+                or kind == 'glob' and fnmatch.fnmatchcase(title.lower(), pattern.lower())
+                or kind == 'regex' and re.search(pattern, title, re.IGNORECASE)):
+            return rule['category']
+    return time_tracker.window_category(title)
+
+
+@pytest.mark.parametrize('title', TITLES)
+def test_classify_agrees_with_each_rule_kind(title):
+    for first in range(len(RULES)):
+        # Every suffix of the list, so each rule gets to be the first one that matches
+        rules = RULES[first:]
+        assert time_tracker.WindowClassifier(rules).classify(title) == reference_classify(rules, title), rules[0]
+
+
+def test_bracket_globs_reach_the_matcher():
+    classifier = time_tracker.WindowClassifier(RULES[:2])
+    assert classifier.classify('xabc - foo') == 'set glob'
+    assert classifier.classify('qdef - bar') == 'negated glob'
+
+
+def test_back_references_keep_their_own_groups():
+    assert time_tracker.WindowClassifier(RULES[2:4]).classify('bb') == 'B'
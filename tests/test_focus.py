@@ -0,0 +1,81 @@
+import sqlite3
+from datetime import date
+
+import benchmarks
+import time_tracker
+
+
+def make_history(tmp_path):
+    """Two months of sessions, the first archived, with more sessions than one batch chunk in each"""
+    db_path = str(tmp_path / 'tracker.db')
+    benchmarks.generate_synthetic_history(db_path, days=59, sessions_per_day=3, tasks_per_session=2,
+                                            samples_per_task=12, start_day=date(2025, 1, 1))
+    assert time_tracker.archive_sessions(db_path, date(2025, 2, 1))
+    return db_path
+
+
+def test_batch_report_spans_archives_and_chunks(tmp_path):
+    db_path = make_history(tmp_path)
+    out_path = tmp_path / 'report.html'
+
+    rendered = time_tracker.render_batch_report(db_path, date(2025, 1, 1), date(2025, 2, 28), str(out_path), workers=1)
+
+    assert rendered == 59 * 3
+    assert out_path.read_text(encoding='utf-8').count('class="tasks-section session-section"') == rendered
+
+
+def test_focus_samples_span_archives(tmp_path):
+    db_path = make_history(tmp_path)
+    conn = time_tracker.connect_db(db_path)
+    try:
+        samples = time_tracker.load_focus_samples(conn, date(2025, 1, 1), date(2025, 2, 28))
+        # Nothing is left open, so the connection can still write and attach
+        assert not conn.in_transaction
+        assert conn.execute('PRAGMA database_list').fetchall()[-1][1] == 'main'
+    finally:
+        conn.close()
+
+    assert len(samples) == 59 * 3 * 2 * 12
+    per_task, total = time_tracker.focus_stats(samples)
+    assert total.tracked_seconds > 0
+    assert {focus.name for focus in per_task} <= set(samples.groups)
+
+
+def test_titles_are_interned_for_old_databases(tmp_path):
+    db_path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE window_samples (id INTEGER PRIMARY KEY, session_task_id INTEGER, timestamp TIMESTAMP, title TEXT)')
+    conn.executemany('INSERT INTO window_samples (session_task_id, timestamp, title) VALUES (1, ?, ?)',
+                     [('2025-01-01 09:00:00', 'Inbox - Outlook'), ('2025-01-01 09:00:05', None),
+                      ('2025-01-01 09:00:10', 'Inbox - Outlook')])
+    conn.commit()
+    conn.close()
+
+    time_tracker.init_database(db_path)
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('''
+        SELECT ws.title, wt.title FROM window_samples ws JOIN window_titles wt ON wt.id = ws.title_id ORDER BY ws.id
+    ''').fetchall()
+    conn.close()
+    assert rows == [('Inbox - Outlook', 'Inbox - Outlook'), (None, ''), ('Inbox - Outlook', 'Inbox - Outlook')]
+
+
+def focus_of(titles):
+    interval = time_tracker.SAMPLE_INTERVAL_SECONDS
+    rows = [(1, 'Write', n * interval, title, 'IDE') for n, title in enumerate(titles)]
+    per_task, total = time_tracker.focus_stats(time_tracker.FocusSamples.from_rows(rows))
+    return total
+
+
+def test_switching_between_related_windows_lowers_the_score():
+    samples = 3600 // time_tracker.SAMPLE_INTERVAL_SECONDS
+    steady = focus_of(['main.py - Visual Studio Code'] * samples)
+    per_minute = 60 // time_tracker.SAMPLE_INTERVAL_SECONDS
+    hopping = focus_of([f"file{n // per_minute % 2}.py - Visual Studio Code" for n in range(samples)])
+
+    assert steady.focus_score == 1.0 and steady.unrelated_share == 0
+    assert hopping.unrelated_share == 0
+    assert round(hopping.switch_rate) == 59
+    expected = time_tracker.FOCUS_HALF_SWITCH_RATE / (time_tracker.FOCUS_HALF_SWITCH_RATE + hopping.switch_rate)
+    assert abs(hopping.focus_score - expected) < 1e-9
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+from datetime import date
+
+import pytest
+
+import benchmarks
+import time_tracker
+
+
+def make_source(tmp_path, name):
+    db_path = str(tmp_path / name / 'tracker.db')
+    os.makedirs(os.path.dirname(db_path))
+    benchmarks.generate_synthetic_history(db_path, days=45, sessions_per_day=1, tasks_per_session=2,
+                                            samples_per_task=6, start_day=date(2025, 1, 1))
+    assert time_tracker.archive_sessions(db_path, date(2025, 2, 1))
+    return db_path
+
+
+def file_digests(folder):
+    return {os.path.join(root, name): hashlib.sha1(open(os.path.join(root, name), 'rb').read()).hexdigest()
+            for root, _, names in os.walk(folder) for name in names}
+
+
+def test_merge_leaves_sources_untouched(tmp_path):
+    source = make_source(tmp_path, 'laptop')
+    # A source written before the window title table existed still needs migrating, but only in a copy
+    conn = sqlite3.connect(source)
+    with conn:
+        conn.execute('DROP TABLE window_titles')
+        conn.execute("DELETE FROM settings WHERE key = 'window_titles_built'")
+    conn.close()
+    before = file_digests(tmp_path / 'laptop')
+
+    merged, duplicates, still_open = time_tracker.merge_databases(str(tmp_path / 'combined.db'), [source])
+
+    assert (merged, duplicates, still_open) == (45, 0, 0)
+    assert file_digests(tmp_path / 'laptop') == before
+    conn = sqlite3.connect(str(tmp_path / 'combined.db'))
+    (untitled,) = conn.execute('SELECT COUNT(*) FROM window_samples WHERE title_id IS NULL').fetchone()
+    conn.close()
+    assert untitled == 0
+
+
+def test_merge_fails_on_a_missing_archive(tmp_path):
+    source = make_source(tmp_path, 'laptop')
+    archives = os.listdir(os.path.join(os.path.dirname(source), time_tracker.ARCHIVE_DIR))
+    os.remove(os.path.join(os.path.dirname(source), time_tracker.ARCHIVE_DIR, archives[0]))
+
+    with pytest.raises(FileNotFoundError, match='2025-01'):
+        time_tracker.merge_databases(str(tmp_path / 'combined.db'), [source])
+    assert not os.path.exists(tmp_path / 'combined.db')
+
+
+def test_merge_fails_on_a_missing_source(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        time_tracker.merge_databases(str(tmp_path / 'combined.db'), [str(tmp_path / 'nowhere.db')])
+    assert not os.path.exists(tmp_path / 'nowhere.db')
+
+
+def test_merge_of_a_database_from_an_older_version(tmp_path):
+    # The bundled database predates the closed flag; none of its sessions can still be running
+    bundled = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'time_tracker.db')
+    source = str(tmp_path / 'old.db')
+    shutil.copy(bundled, source)
+    conn = sqlite3.connect(source)
+    (sessions,) = conn.execute('SELECT COUNT(*) FROM sessions').fetchone()
+    conn.close()
+
+    merged, duplicates, still_open = time_tracker.merge_databases(str(tmp_path / 'combined.db'), [source])
+
+    assert merged + duplicates == sessions
+    assert merged > 0 and still_open == 0
+
+
+def test_merging_again_and_copies_change_nothing(tmp_path):
+    laptop = make_source(tmp_path, 'laptop')
+    copy = str(tmp_path / 'copy' / 'tracker.db')
+    shutil.copytree(tmp_path / 'laptop', tmp_path / 'copy')
+    target = str(tmp_path / 'combined.db')
+
+    # The copy holds the same sessions, so all of them are duplicates
+    assert time_tracker.merge_databases(target, [laptop, copy]) == (45, 45, 0)
+    before = table_rows(target)
+    assert time_tracker.merge_databases(target, [laptop, copy]) == (0, 90, 0)
+    assert table_rows(target) == before
+
+
+def table_rows(db_path):
+    """Every row of the merged tables, across the target and its archives"""
+    rows = {}
+    for path in [db_path] + [os.path.join(os.path.dirname(db_path), time_tracker.ARCHIVE_DIR, name)
+                             for name in sorted(os.listdir(os.path.join(os.path.dirname(db_path), time_tracker.ARCHIVE_DIR)))]:
+        conn = sqlite3.connect(path)
+        for table in ('sessions', 'session_tasks', 'sub_tasks', 'window_samples', 'daily_reports', 'task_templates', 'daily_rollup'):
+            rows[path, table] = conn.execute(f'SELECT * FROM {table} ORDER BY 1').fetchall()
+        conn.close()
+    return rows
@@ -0,0 +1,110 @@
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import benchmarks
+import time_tracker
+
+COUNTED_TABLES = ('session_tasks', 'sub_tasks', 'daily_reports', 'window_samples')
+
+
+def row_counts(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in COUNTED_TABLES}
+    finally:
+        conn.close()
+
+
+def test_repeated_reports_do_not_grow_the_database(tmp_path):
+    db_path = str(tmp_path / 'tracker.db')
+    clock = benchmarks.VirtualClock(datetime(2026, 1, 5, 9, 0))
+    windows = benchmarks.ScriptedWindowSampler(benchmarks.SIMULATION_TITLES[0])
+    tracker = time_tracker.SessionTracker(db_path, clock=clock, idle_source=benchmarks.FakeIdleSource(),
+                                          window_sampler=windows,
+                                          resource_sampler=time_tracker.ResourceSampler(pid_source=lambda: None))
+    tasks = [{'name': f"Task {n + 1}", 'minutes': 30, 'actual_seconds': 0,
+              'subtasks': [{'name': 'Step', 'completed': False}]} for n in range(3)]
+    tracker.start_session(tasks, 90, clock.now() + timedelta(hours=2))
+    for n, title in enumerate(benchmarks.SIMULATION_TITLES[:3]):
+        tracker.switch_to_task(n)
+        windows.title = title
+        for _ in range(120):
+            clock.wait(tracker.tick(), tracker.wake)
+
+    tracker.save_report()
+    counts = row_counts(db_path)
+    assert counts['window_samples'] > 0
+    tracker.save_report()
+    size = os.path.getsize(db_path)
+
+    for _ in range(50):
+        tracker.save_report()
+
+    assert row_counts(db_path) == counts
+    assert os.path.getsize(db_path) == size
+
+
+def test_batch_report_header_counts_open_sessions(tmp_path):
+    db_path = str(tmp_path / 'tracker.db')
+    clock = benchmarks.VirtualClock(datetime.now().replace(microsecond=0))
+    tracker = time_tracker.SessionTracker(db_path, clock=clock, idle_source=benchmarks.FakeIdleSource(),
+                                          window_sampler=benchmarks.ScriptedWindowSampler(benchmarks.SIMULATION_TITLES[0]),
+                                          resource_sampler=time_tracker.ResourceSampler(pid_source=lambda: None))
+    tracker.start_session([{'name': 'Write', 'minutes': 45, 'actual_seconds': 0, 'subtasks': []}], 45,
+                          clock.now() + timedelta(hours=1))
+    for _ in range(120):
+        clock.wait(tracker.tick(), tracker.wake)
+    tracker.save_report()
+
+    out_path = tmp_path / 'report.html'
+    today = clock.now().date()
+    assert time_tracker.render_batch_report(db_path, today, today, str(out_path), workers=1) == 1
+    expected = time_tracker.report_page_start(
+        "Time Tracking Report", f"{today:%B %d, %Y} – {today:%B %d, %Y}",
+        [(1, "Sessions"), (45, "Planned Minutes"), (tracker.tracked_seconds // 60, "Actual Minutes")])
+    assert out_path.read_text(encoding='utf-8').startswith(expected)
+
+
+def make_legacy_database(db_path):
+    """A session saved twice by an old version, each save adding another full copy of its task"""
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE sessions (id INTEGER PRIMARY KEY, total_minutes INTEGER, start_time TIMESTAMP, end_time TIMESTAMP)')
+    conn.execute('CREATE TABLE session_tasks (id INTEGER PRIMARY KEY, session_id INTEGER, task_name TEXT, planned_minutes INTEGER, actual_seconds INTEGER, completed BOOLEAN, processes TEXT)')
+    conn.execute("INSERT INTO sessions VALUES (1, 30, '2025-01-06 09:00:00', '2025-01-06 09:30:00')")
+    samples = [{'timestamp': f'2025-01-06 09:0{n}:00', 'process': 'Inbox - Outlook'} for n in range(3)]
+    conn.executemany('INSERT INTO session_tasks (session_id, task_name, planned_minutes, actual_seconds, completed, processes) VALUES (1, ?, 30, ?, 0, ?)',
+                     [('Email', 60, json.dumps(samples[:2])), ('Email', 180, json.dumps(samples))])
+    conn.commit()
+    conn.close()
+
+
+def test_legacy_samples_are_moved_once(tmp_path):
+    db_path = str(tmp_path / 'legacy.db')
+    make_legacy_database(db_path)
+
+    time_tracker.init_database(db_path)
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('SELECT session_task_id, timestamp FROM window_samples ORDER BY timestamp').fetchall()
+    conn.close()
+    assert rows == [(2, '2025-01-06 09:00:00'), (2, '2025-01-06 09:01:00'), (2, '2025-01-06 09:02:00')]
+
+
+def test_samples_of_superseded_tasks_are_pruned(tmp_path):
+    db_path = str(tmp_path / 'legacy.db')
+    make_legacy_database(db_path)
+    time_tracker.init_database(db_path)
+    # As left behind by the earlier migration, which also copied the superseded task's samples
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("INSERT INTO window_samples (session_task_id, timestamp, title) VALUES (1, '2025-01-06 09:00:00', 'Inbox - Outlook')")
+        conn.execute("DELETE FROM settings WHERE key = 'legacy_samples_pruned'")
+    conn.close()
+
+    time_tracker.init_database(db_path)
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT DISTINCT session_task_id FROM window_samples').fetchall() == [(2,)]
+    conn.close()
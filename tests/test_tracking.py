@@ -0,0 +1,59 @@
+import argparse
+from datetime import datetime, timedelta
+
+import benchmarks
+import time_tracker
+
+
+def make_tracker(db_path, clock):
+    tracker = time_tracker.SessionTracker(
+        str(db_path), clock=clock, idle_source=benchmarks.FakeIdleSource(),
+        window_sampler=benchmarks.ScriptedWindowSampler(benchmarks.SIMULATION_TITLES[0]),
+        resource_sampler=time_tracker.ResourceSampler(pid_source=lambda: None))
+    tasks = [{'name': f"Task {n + 1}", 'minutes': 30, 'actual_seconds': 0, 'subtasks': []} for n in range(3)]
+    tracker.start_session(tasks, 90, clock.now() + timedelta(hours=2))
+    return tracker
+
+
+def test_resume_does_not_credit_a_free_second(tmp_path):
+    clock = benchmarks.VirtualClock(datetime(2026, 1, 5, 9, 0))
+    tracker = make_tracker(tmp_path / 'tracker.db', clock)
+
+    for _ in range(100):
+        tracker.toggle_pause()
+        tracker.tick()
+        clock.advance(5)
+        tracker.toggle_pause()
+        tracker.tick()
+
+    assert tracker.tracked_seconds == 0
+
+
+def test_pause_and_resume_count_only_running_time(tmp_path):
+    clock = benchmarks.VirtualClock(datetime(2026, 1, 5, 9, 0))
+    tracker = make_tracker(tmp_path / 'tracker.db', clock)
+
+    running = 0.0
+    for n in range(50):
+        for _ in range(3):
+            clock.wait(tracker.tick(), tracker.wake)
+            running += 1
+        clock.advance(0.5)
+        running += 0.5
+        tracker.toggle_pause()
+        tracker.tick()
+        clock.advance(60)
+        tracker.toggle_pause()
+
+    # Fractions of a second are dropped at each pause, never added
+    assert running - 50 <= tracker.tracked_seconds <= running
+
+
+def test_simulated_days_track_accurately(tmp_path):
+    args = argparse.Namespace(days=2, seed=3, jitter=0.1, db=str(tmp_path / 'simulation.db'))
+    assert benchmarks.run_simulation(args) == 0
+
+
+def test_stress_tracks_the_running_time(tmp_path):
+    args = argparse.Namespace(seconds=2, threads=4, speed=100, db=str(tmp_path / 'stress.db'))
+    assert benchmarks.run_stress_test(args) == 0
@@ -3,10 +3,16 @@ Windows Time Tracker - Background Application
 A minimal desktop application that runs in background with a floating timer widget.
 
 Requirements:
-pip install psutil pygetwindow pystray pillow customtkinter
+pip install psutil pygetwindow pystray pillow customtkinter numpy
+pip install python-xlib                # Linux only: per-application CPU and memory attribution
 
 Usage:
 python time_tracker.py
+python time_tracker.py report month    # batch report over stored sessions
+python time_tracker.py archive         # move old sessions into monthly archive files
+python time_tracker.py merge other.db  # merge the history of another machine's database
+
+Benchmarks, the simulation and the stress test live in benchmarks.py.
 """
 
 import tkinter as tk
@@ -16,6 +22,7 @@ import sqlite3
 import json
 from datetime import datetime, timedelta
 import psutil
+import numpy as np
 import threading
 import time
 import webbrowser
@@ -24,6 +31,2269 @@ from pathlib import Path
 import pystray
 from PIL import Image, ImageDraw
 import sys
+import ctypes
+import ctypes.util
+import argparse
+import re
+import fnmatch
+import functools
+import zlib
+import hashlib
+import html
+import tempfile
+import math
+import bisect
+import heapq
+import queue
+from collections import deque, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+
+IDLE_THRESHOLD_SECONDS = 5 * 60
+IDLE_POLL_SECONDS = 5
+SAMPLE_INTERVAL_SECONDS = 10
+RESOURCE_CPU_BUDGET = 0.005  # fraction of one core the resource sampler may use
+RESOURCE_MIN_INTERVAL = 2.0
+RESOURCE_MAX_INTERVAL = 60.0
+PROCESS_TABLE_TTL = 60.0
+CLASSIFIER_RULES_FILE = "classifier_rules.json"
+CLASSIFIER_CACHE_SIZE = 8192
+TIMELINE_BUCKETS = 240
+TICK_MAX_CREDIT_SECONDS = 5
+UI_DRAIN_MS = 100
+AUTOSAVE_SECONDS = 60
+
+# --- Idle Detection ---
+class IdleSource:
+    """Reports seconds since the last keyboard/mouse input. The base source never reports idle."""
+
+    def idle_seconds(self):
+        return 0.0
+
+
+class WindowsIdleSource(IdleSource):
+    """Idle time from the Windows GetLastInputInfo API"""
+
+    def __init__(self):
+        from ctypes import wintypes
+
+        class LASTINPUTINFO(ctypes.Structure):
+            _fields_ = [('cbSize', wintypes.UINT), ('dwTime', wintypes.DWORD)]
+
+        self._user32 = ctypes.windll.user32
+        self._kernel32 = ctypes.windll.kernel32
+        self._kernel32.GetTickCount.restype = wintypes.DWORD
+        self._info = LASTINPUTINFO()
+        self._info.cbSize = ctypes.sizeof(LASTINPUTINFO)
+
+    def idle_seconds(self):
+        if not self._user32.GetLastInputInfo(ctypes.byref(self._info)):
+            return 0.0
+        # Both values are 32-bit tick counts, so mask the difference to survive wraparound
+        millis = (self._kernel32.GetTickCount() - self._info.dwTime) & 0xFFFFFFFF
+        return millis / 1000.0
+
+
+class X11IdleSource(IdleSource):
+    """Idle time from the X11 screensaver extension (libXss)"""
+
+    def __init__(self):
+        class XScreenSaverInfo(ctypes.Structure):
+            _fields_ = [('window', ctypes.c_ulong), ('state', ctypes.c_int),
+                        ('kind', ctypes.c_int), ('til_or_since', ctypes.c_ulong),
+                        ('idle', ctypes.c_ulong), ('event_mask', ctypes.c_ulong)]
+
+        xlib_name = ctypes.util.find_library('X11')
+        xss_name = ctypes.util.find_library('Xss')
+        if not xlib_name or not xss_name:
+            raise OSError("libX11/libXss not found")
+
+        self._xlib = ctypes.cdll.LoadLibrary(xlib_name)
+        self._xss = ctypes.cdll.LoadLibrary(xss_name)
+        self._xlib.XOpenDisplay.restype = ctypes.c_void_p
+        self._xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        self._xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        self._xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        self._xss.XScreenSaverAllocInfo.restype = ctypes.POINTER(XScreenSaverInfo)
+        self._xss.XScreenSaverQueryInfo.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XScreenSaverInfo)]
+
+        self._display = self._xlib.XOpenDisplay(None)
+        if not self._display:
+            raise OSError("Cannot open X display")
+        self._root_window = self._xlib.XDefaultRootWindow(self._display)
+        self._info = self._xss.XScreenSaverAllocInfo()
+
+    def idle_seconds(self):
+        if not self._xss.XScreenSaverQueryInfo(self._display, self._root_window, self._info):
+            return 0.0
+        return self._info.contents.idle / 1000.0
+
+
+def create_idle_source():
+    """Pick the best idle source for this platform, falling back to one that never reports idle"""
+    try:
+        if sys.platform == 'win32':
+            return WindowsIdleSource()
+        if os.environ.get('DISPLAY'):
+            return X11IdleSource()
+    except (OSError, AttributeError) as e:
+        print(f"Idle detection unavailable: {e}")
+    return IdleSource()
+
+
+# --- Resource Attribution ---
+def foreground_pid():
+    """PID of the process that owns the foreground window, or None if it can't be determined"""
+    if sys.platform == 'win32':
+        user32 = ctypes.windll.user32
+        hwnd = user32.GetForegroundWindow()
+        if not hwnd:
+            return None
+        pid = ctypes.c_ulong()
+        user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        return pid.value or None
+    return _x11_foreground_pid()
+
+
+_x11_display = None
+_x11_unavailable = False
+
+def _x11_foreground_pid():
+    global _x11_display, _x11_unavailable
+    if _x11_unavailable:
+        return None
+    try:
+        from Xlib import display as xdisplay, X
+        if _x11_display is None:
+            _x11_display = xdisplay.Display()
+    except Exception as e:
+        # Missing python-xlib or no X server; say so once instead of on every sample
+        print(f"Resource attribution unavailable: {e}")
+        _x11_unavailable = True
+        return None
+    try:
+        root = _x11_display.screen().root
+        active = root.get_full_property(_x11_display.intern_atom('_NET_ACTIVE_WINDOW'), X.AnyPropertyType)
+        if not active or not active.value[0]:
+            return None
+        window = _x11_display.create_resource_object('window', active.value[0])
+        pid = window.get_full_property(_x11_display.intern_atom('_NET_WM_PID'), X.AnyPropertyType)
+        return int(pid.value[0]) if pid else None
+    except Exception:
+        return None
+
+
+class ResourceSampler:
+    """
+    Samples CPU time and RSS of the foreground process.
+
+    The process table is built with a single psutil.process_iter() pass over a
+    restricted attribute list and reused until it goes stale or an unknown PID
+    shows up. The sampling interval adapts to the measured cost of a sample so
+    the sampler stays below `cpu_budget` of one core.
+    """
+
+    def __init__(self, cpu_budget=RESOURCE_CPU_BUDGET, pid_source=foreground_pid):
+        self.cpu_budget = cpu_budget
+        self.pid_source = pid_source
+        self.interval = RESOURCE_MIN_INTERVAL
+        self.cpu_used = 0.0
+        self.samples_taken = 0
+        self._processes = {}
+        self._table_time = None
+        self._next_sample = 0.0
+        self._last_pid = None
+        self._last_cpu = 0.0
+        self._cost = 0.0
+
+    def due(self, now):
+        return now >= self._next_sample
+
+    def refresh_table(self, now):
+        self._processes = {
+            proc.pid: (proc, proc.info['name'] or f"pid {proc.pid}")
+            for proc in psutil.process_iter(['name'])
+        }
+        self._table_time = now
+
+    def sample(self, now):
+        """Return (process name, cpu seconds since the last sample, rss bytes) or None"""
+        start = time.process_time()
+        try:
+            return self._sample(now)
+        finally:
+            cost = time.process_time() - start
+            self.cpu_used += cost
+            self.samples_taken += 1
+            self._cost = cost if self.samples_taken == 1 else 0.8 * self._cost + 0.2 * cost
+            self.interval = min(max(self._cost / self.cpu_budget, RESOURCE_MIN_INTERVAL), RESOURCE_MAX_INTERVAL)
+            self._next_sample = now + self.interval
+
+    def _sample(self, now):
+        pid = self.pid_source()
+        if pid is None:
+            self._last_pid = None
+            return None
+
+        if self._table_time is None or now - self._table_time > PROCESS_TABLE_TTL or pid not in self._processes:
+            self.refresh_table(now)
+        entry = self._processes.get(pid)
+        if entry is None:
+            return None
+
+        proc, name = entry
+        try:
+            with proc.oneshot():
+                cpu_times = proc.cpu_times()
+                rss = proc.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            self._processes.pop(pid, None)
+            self._last_pid = None
+            return None
+
+        cpu_total = cpu_times.user + cpu_times.system
+        # Only credit CPU time burned while this process stayed in the foreground
+        cpu_delta = max(0.0, cpu_total - self._last_cpu) if pid == self._last_pid else 0.0
+        self._last_pid = pid
+        self._last_cpu = cpu_total
+        return name, cpu_delta, rss
+
+
+def add_resource_sample(usage, name, cpu_delta, rss):
+    """Fold one sample into a compact per-task aggregate"""
+    usage['cpu_seconds'] = usage.get('cpu_seconds', 0.0) + cpu_delta
+    usage['rss_peak'] = max(usage.get('rss_peak', 0), rss)
+    usage['rss_total'] = usage.get('rss_total', 0) + rss
+    usage['samples'] = usage.get('samples', 0) + 1
+    processes = usage.setdefault('processes', {})
+    processes[name] = processes.get(name, 0.0) + cpu_delta
+    return usage
+
+
+# --- Database ---
+def connect_db(db_path):
+    """Open a connection with the SQL functions the rollup and analytics queries rely on"""
+    conn = sqlite3.connect(db_path)
+    conn.create_function('classify_title', 1, lambda title: get_classifier().classify(title), deterministic=True)
+    conn.create_function('content_hash', 1, lambda text: hashlib.sha1(text.encode()).hexdigest(), deterministic=True)
+    return conn
+
+
+def init_database(db_path):
+    """Create or migrate the schema of a tracker database"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    cursor.execute('''CREATE TABLE IF NOT EXISTS task_templates (id INTEGER PRIMARY KEY, name TEXT NOT NULL, default_minutes INTEGER NOT NULL)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY, total_minutes INTEGER, start_time TIMESTAMP, end_time TIMESTAMP)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS session_tasks (id INTEGER PRIMARY KEY, session_id INTEGER, task_name TEXT, planned_minutes INTEGER, actual_seconds INTEGER, completed BOOLEAN, processes TEXT)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS sub_tasks (id INTEGER PRIMARY KEY, session_task_id INTEGER, name TEXT, completed BOOLEAN)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS daily_reports (id INTEGER PRIMARY KEY, session_id INTEGER, report_date DATE, report_html TEXT, total_planned_minutes INTEGER, total_actual_minutes INTEGER, tasks_count INTEGER, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS window_samples (id INTEGER PRIMARY KEY, session_task_id INTEGER, timestamp TIMESTAMP, title TEXT)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS window_titles (id INTEGER PRIMARY KEY, title TEXT NOT NULL UNIQUE)''')
+
+    ensure_column(cursor, 'session_tasks', 'resources', 'TEXT')
+    ensure_column(cursor, 'session_tasks', 'position', 'INTEGER')
+    ensure_column(cursor, 'sub_tasks', 'position', 'INTEGER')
+    ensure_column(cursor, 'window_samples', 'category', 'TEXT')
+    ensure_column(cursor, 'window_samples', 'title_id', 'INTEGER')
+    ensure_column(cursor, 'sessions', 'timeline', 'TEXT')
+    ensure_column(cursor, 'sessions', 'closed', 'INTEGER NOT NULL DEFAULT 0')
+    ensure_column(cursor, 'daily_reports', 'created_at', 'TIMESTAMP')
+
+    # Reports used to be re-inserted on every generate; keep only the latest summary per session
+    cursor.execute('''DELETE FROM daily_reports WHERE id NOT IN (SELECT MAX(id) FROM daily_reports GROUP BY session_id)''')
+    cursor.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_daily_reports_session ON daily_reports (session_id)''')
+    cursor.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_session_tasks_position ON session_tasks (session_id, position)''')
+    cursor.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_sub_tasks_position ON sub_tasks (session_task_id, position)''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_window_samples_task ON window_samples (session_task_id)''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions (start_time)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS daily_rollup (day DATE PRIMARY KEY, planned_minutes INTEGER, actual_seconds INTEGER, session_count INTEGER, tasks_completed INTEGER, top_categories TEXT)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS archives (month TEXT PRIMARY KEY, path TEXT NOT NULL, first_day DATE, last_day DATE, session_count INTEGER, archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS task_stats (name_key TEXT PRIMARY KEY, name TEXT NOT NULL, count INTEGER NOT NULL, mean_seconds REAL NOT NULL, ewma_seconds REAL NOT NULL, sketch TEXT NOT NULL)''')
+    # Legacy sessions may hold several copies of each task (one per generated report); keep the latest
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS current_session_tasks AS
+        SELECT * FROM session_tasks
+        WHERE position IS NOT NULL
+           OR id IN (SELECT MAX(id) FROM session_tasks WHERE position IS NULL GROUP BY session_id, task_name)
+    ''')
+
+    # Older rows kept their window samples as a JSON blob in session_tasks.processes; the superseded
+    # copies of a task hold earlier snapshots of the same samples, so only the latest one is moved
+    if not cursor.execute("SELECT 1 FROM settings WHERE key = 'window_samples_migrated'").fetchone():
+        cursor.execute('''
+            INSERT INTO window_samples (session_task_id, timestamp, title)
+            SELECT st.id, json_extract(j.value, '$.timestamp'), json_extract(j.value, '$.process')
+            FROM current_session_tasks st, json_each(st.processes) j
+            WHERE st.processes IS NOT NULL AND json_valid(st.processes)
+        ''')
+        cursor.execute("INSERT INTO settings (key, value) VALUES ('window_samples_migrated', 'true')")
+        cursor.execute("INSERT INTO settings (key, value) VALUES ('legacy_samples_pruned', 'true')")
+    elif not cursor.execute("SELECT 1 FROM settings WHERE key = 'legacy_samples_pruned'").fetchone():
+        # Databases migrated before that also copied the superseded ones
+        cursor.execute('''
+            DELETE FROM window_samples WHERE session_task_id IN (
+                SELECT id FROM session_tasks WHERE position IS NULL AND id NOT IN (SELECT id FROM current_session_tasks)
+            )
+        ''')
+        cursor.execute("INSERT INTO settings (key, value) VALUES ('legacy_samples_pruned', 'true')")
+
+    # Samples point at an interned title, so analytics can compare titles as integers
+    if not cursor.execute("SELECT 1 FROM settings WHERE key = 'window_titles_built'").fetchone():
+        cursor.execute("INSERT OR IGNORE INTO window_titles (title) SELECT DISTINCT COALESCE(title, '') FROM window_samples")
+        cursor.execute('''
+            UPDATE window_samples SET title_id = (SELECT id FROM window_titles WHERE title = COALESCE(window_samples.title, ''))
+            WHERE title_id IS NULL
+        ''')
+        cursor.execute("INSERT INTO settings (key, value) VALUES ('window_titles_built', 'true')")
+        archive_dir = os.path.dirname(os.path.abspath(db_path))
+        archive_paths = [os.path.join(archive_dir, path) for (path,) in cursor.execute('SELECT path FROM archives')]
+    else:
+        archive_paths = []
+
+    # Task statistics are kept up to date as sessions close; build them once from the history before that
+    if not cursor.execute("SELECT 1 FROM settings WHERE key = 'task_stats_built'").fetchone():
+        record_task_stats(conn, 's.closed')
+        cursor.execute("INSERT INTO settings (key, value) VALUES ('task_stats_built', 'true')")
+
+    conn.commit()
+    conn.close()
+
+    conn = connect_db(db_path)
+    with conn:
+        # Stored categories follow the current rules file; re-derive them when it changes
+        rules = json.dumps(get_classifier().rules, sort_keys=True)
+        stored_rules = conn.execute("SELECT value FROM settings WHERE key = 'classifier_rules'").fetchone()
+        rules_changed = stored_rules is None or stored_rules[0] != rules
+        if rules_changed:
+            conn.execute('UPDATE window_samples SET category = classify_title(title)')
+            conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('classifier_rules', ?)", (rules,))
+            refresh_daily_rollup(conn)
+        elif not conn.execute('SELECT 1 FROM daily_rollup LIMIT 1').fetchone():
+            refresh_daily_rollup(conn)
+    conn.close()
+
+    # Archives written before a schema change get the same migration
+    for path in archive_paths:
+        if os.path.exists(path):
+            init_database(path)
+    if rules_changed:
+        reclassify_archives(db_path)
+
+
+def ensure_column(cursor, table, column, declaration):
+    columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+
+# --- Daily Rollup ---
+def window_category(title):
+    """Group a window title by application, e.g. 'notes.txt - Notepad' -> 'Notepad'"""
+    if not title:
+        return 'Unknown'
+    for separator in (' - ', ' — ', ' | '):
+        if separator in title:
+            return title.rsplit(separator, 1)[1].strip() or 'Unknown'
+    return title.strip()[:40] or 'Unknown'
+
+
+def refresh_daily_rollup(conn, day=None):
+    """
+    Recompute daily_rollup rows from sessions, tasks and window samples.
+    With a day only that row is refreshed (when a session closes); without one
+    the whole table is rebuilt in bulk. Days that were archived keep their rows,
+    since their sessions are no longer in this database.
+    """
+    archived = 'EXISTS (SELECT 1 FROM archives a WHERE daily_rollup.day BETWEEN a.first_day AND a.last_day)'
+    if day is None:
+        day_filter, params = '1 = 1', ()
+        conn.execute(f'DELETE FROM daily_rollup WHERE NOT {archived}')
+    else:
+        day_filter, params = "s.start_time >= ? AND s.start_time < date(?, '+1 day')", (str(day), str(day))
+
+    conn.execute(f'''
+        INSERT OR REPLACE INTO daily_rollup (day, planned_minutes, actual_seconds, session_count, tasks_completed)
+        SELECT date(s.start_time) AS day,
+               COALESCE(SUM(st.planned_minutes), 0),
+               COALESCE(SUM(st.actual_seconds), 0),
+               COUNT(DISTINCT s.id),
+               COALESCE(SUM(st.completed), 0)
+        FROM sessions s
+        LEFT JOIN current_session_tasks st ON st.session_id = s.id
+        WHERE s.start_time IS NOT NULL AND {day_filter}
+        GROUP BY date(s.start_time)
+    ''', params)
+
+    conn.execute(f'''
+        UPDATE daily_rollup SET top_categories = (
+            SELECT json_group_array(json_array(category, samples * {SAMPLE_INTERVAL_SECONDS})) FROM (
+                SELECT COALESCE(ws.category, classify_title(ws.title)) AS category, COUNT(*) AS samples
+                FROM sessions s
+                JOIN current_session_tasks st ON st.session_id = s.id
+                JOIN window_samples ws ON ws.session_task_id = st.id
+                WHERE s.start_time >= daily_rollup.day AND s.start_time < date(daily_rollup.day, '+1 day')
+                GROUP BY category
+                ORDER BY samples DESC
+                LIMIT 3
+            )
+        )
+        WHERE NOT {archived} AND {'1 = 1' if day is None else 'day = ?'}
+    ''', () if day is None else (str(day),))
+
+
+# --- Archives ---
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_DIR = "archive"
+
+# Explicit column lists, since migrated databases may have their columns in a different order
+ARCHIVED_TABLES = [
+    ('sessions', 'id, total_minutes, start_time, end_time, timeline, closed',
+     'id IN (SELECT id FROM temp.archiving)'),
+    ('session_tasks', 'id, session_id, task_name, planned_minutes, actual_seconds, completed, processes, resources, position',
+     'session_id IN (SELECT id FROM temp.archiving)'),
+    ('sub_tasks', 'id, session_task_id, name, completed, position',
+     'session_task_id IN (SELECT id FROM main.session_tasks WHERE session_id IN (SELECT id FROM temp.archiving))'),
+    ('window_samples', 'id, session_task_id, timestamp, title, category, title_id',
+     'session_task_id IN (SELECT id FROM main.session_tasks WHERE session_id IN (SELECT id FROM temp.archiving))'),
+    ('daily_reports', 'id, session_id, report_date, report_html, total_planned_minutes, total_actual_minutes, tasks_count, created_at',
+     'session_id IN (SELECT id FROM temp.archiving)'),
+]
+
+
+def archive_cutoff(today, after_days=ARCHIVE_AFTER_DAYS):
+    """Sessions before this day get archived: whole months that ended at least after_days ago"""
+    return (today - timedelta(days=after_days)).replace(day=1)
+
+
+def archive_path(db_path, month):
+    db_path = os.path.abspath(db_path)
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(os.path.dirname(db_path), ARCHIVE_DIR, f"{stem}_{month}.db")
+
+
+def archive_sessions(db_path, cutoff_day):
+    """
+    Move closed sessions that started before cutoff_day, with their tasks, subtasks,
+    window samples and reports, into one archive database per month, and record each
+    archive in the catalog. Daily rollup rows and task statistics stay in the main
+    database. Returns the number of sessions moved.
+    """
+    conn = connect_db(db_path)
+    try:
+        months = [month for (month,) in conn.execute('''
+            SELECT DISTINCT strftime('%Y-%m', start_time) FROM sessions
+            WHERE closed AND start_time < ? ORDER BY 1
+        ''', (str(cutoff_day),))]
+
+        moved = 0
+        for month in months:
+            path = archive_path(db_path, month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            init_database(path)
+            conn.execute('ATTACH DATABASE ? AS archive', (path,))
+            try:
+                with conn:
+                    conn.execute('''
+                        CREATE TEMP TABLE archiving AS SELECT id FROM sessions
+                        WHERE closed AND start_time < ? AND strftime('%Y-%m', start_time) = ?
+                    ''', (str(cutoff_day), month))
+                    # Titles stay in main too; archives keep main's ids for them
+                    conn.execute('''
+                        INSERT OR REPLACE INTO archive.window_titles (id, title)
+                        SELECT id, title FROM main.window_titles WHERE id IN (
+                            SELECT title_id FROM main.window_samples
+                            WHERE session_task_id IN (SELECT id FROM main.session_tasks WHERE session_id IN (SELECT id FROM temp.archiving))
+                        )
+                    ''')
+                    for table, columns, selection in ARCHIVED_TABLES:
+                        conn.execute(f'INSERT OR REPLACE INTO archive.{table} ({columns}) SELECT {columns} FROM main.{table} WHERE {selection}')
+                    # Children first, since their selections go through the parent rows
+                    for table, _, selection in reversed(ARCHIVED_TABLES):
+                        conn.execute(f'DELETE FROM main.{table} WHERE {selection}')
+                    moved += conn.execute('SELECT COUNT(*) FROM temp.archiving').fetchone()[0]
+                    conn.execute('DROP TABLE temp.archiving')
+                    conn.execute('''
+                        INSERT OR REPLACE INTO archives (month, path, first_day, last_day, session_count)
+                        SELECT ?, ?, MIN(date(start_time)), MAX(date(start_time)), COUNT(*) FROM archive.sessions
+                    ''', (month, os.path.relpath(path, os.path.dirname(os.path.abspath(db_path)))))
+
+                # Rebuild the month's rollup from the archive, which also holds sessions merged into the month later
+                archive_conn = connect_db(path)
+                with archive_conn:
+                    refresh_daily_rollup(archive_conn)
+                archive_conn.close()
+                copy_archive_rollup(conn)
+            finally:
+                conn.execute('DETACH DATABASE archive')
+
+        if moved:
+            # Give the freed pages back so the file (and its backups) actually shrink
+            conn.execute('VACUUM')
+        return moved
+    finally:
+        conn.close()
+
+
+def copy_archive_rollup(conn):
+    """Replace the main rollup rows of the attached archive's days with the archive's own"""
+    with conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO main.daily_rollup (day, planned_minutes, actual_seconds, session_count, tasks_completed, top_categories)
+            SELECT day, planned_minutes, actual_seconds, session_count, tasks_completed, top_categories FROM archive.daily_rollup
+        ''')
+
+
+def reclassify_archives(db_path):
+    """
+    Bring every catalogued archive to the current classifier rules (opening it re-categorizes
+    its samples and rebuilds its rollup when its rules differ) and copy its rollup rows back
+    """
+    conn = connect_db(db_path)
+    try:
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        for month, path in conn.execute('SELECT month, path FROM archives ORDER BY month').fetchall():
+            path = os.path.join(db_dir, path)
+            if not os.path.exists(path):
+                print(f"Archive for {month} is missing: {path}")
+                continue
+            init_database(path)
+            conn.execute('ATTACH DATABASE ? AS archive', (path,))
+            try:
+                copy_archive_rollup(conn)
+            finally:
+                conn.execute('DETACH DATABASE archive')
+    finally:
+        conn.close()
+
+
+def history_schemas(conn, start_day=None, end_day=None):
+    """
+    Yield the schemas holding sessions between start_day and end_day (all of history
+    without a range), oldest first. Each monthly archive in range is attached as
+    'archive' only while the caller works with it; 'main' comes last. Callers must
+    finish their statements on a schema before asking for the next one.
+    """
+    db_dir = os.path.dirname(os.path.abspath(conn.execute('PRAGMA database_list').fetchone()[2]))
+    archives = conn.execute('''
+        SELECT month, path FROM archives
+        WHERE (? IS NULL OR last_day >= ?) AND (? IS NULL OR first_day <= ?)
+        ORDER BY month
+    ''', (start_day and str(start_day),) * 2 + (end_day and str(end_day),) * 2).fetchall()
+    for month, path in archives:
+        path = os.path.join(db_dir, path)
+        if not os.path.exists(path):
+            print(f"Archive for {month} is missing: {path}")
+            continue
+        conn.execute('ATTACH DATABASE ? AS archive', (path,))
+        try:
+            yield 'archive'
+        finally:
+            conn.execute('DETACH DATABASE archive')
+    yield 'main'
+
+
+# --- Merge ---
+# Two sessions are the same when their times and tasks match, whichever machine or merge they came from
+SESSION_CONTENT_HASH = '''content_hash(json_array(s.start_time, s.end_time, s.total_minutes, (
+    SELECT json_group_array(json_array(st.task_name, st.planned_minutes, st.actual_seconds, st.completed))
+    FROM (SELECT * FROM {schema}.current_session_tasks WHERE session_id = s.id ORDER BY position, id) st
+)))'''
+
+# Copies of the rows of the sessions in temp.merge_sessions, with new ids above those already used in
+# the target (including its archives); tasks are renumbered through temp.merge_tasks
+MERGE_STATEMENTS = [
+    ('sessions', '''
+        INSERT INTO main.sessions (id, total_minutes, start_time, end_time, timeline, closed)
+        SELECT m.new_id, s.total_minutes, s.start_time, s.end_time, s.timeline, 1
+        FROM source.sessions s JOIN temp.merge_sessions m ON m.old_id = s.id
+    '''),
+    ('session_tasks', '''
+        INSERT INTO main.session_tasks (id, session_id, task_name, planned_minutes, actual_seconds, completed, processes, resources, position)
+        SELECT t.new_id, t.session_id, st.task_name, st.planned_minutes, st.actual_seconds, st.completed, st.processes, st.resources, st.position
+        FROM source.session_tasks st JOIN temp.merge_tasks t ON t.old_id = st.id
+    '''),
+    ('sub_tasks', '''
+        INSERT INTO main.sub_tasks (id, session_task_id, name, completed, position)
+        SELECT :offset + ROW_NUMBER() OVER (ORDER BY sub.id), t.new_id, sub.name, sub.completed, sub.position
+        FROM source.sub_tasks sub JOIN temp.merge_tasks t ON t.old_id = sub.session_task_id
+    '''),
+    ('window_samples', '''
+        INSERT INTO main.window_samples (id, session_task_id, timestamp, title, category, title_id)
+        SELECT :offset + ROW_NUMBER() OVER (ORDER BY ws.id), t.new_id, ws.timestamp, ws.title, ws.category, title.id
+        FROM source.window_samples ws JOIN temp.merge_tasks t ON t.old_id = ws.session_task_id
+        JOIN main.window_titles title ON title.title = COALESCE(ws.title, '')
+    '''),
+    ('daily_reports', '''
+        INSERT INTO main.daily_reports (id, session_id, report_date, report_html, total_planned_minutes, total_actual_minutes, tasks_count, created_at)
+        SELECT :offset + ROW_NUMBER() OVER (ORDER BY dr.id), m.new_id, dr.report_date, dr.report_html, dr.total_planned_minutes,
+               dr.total_actual_minutes, dr.tasks_count, dr.created_at
+        FROM source.daily_reports dr JOIN temp.merge_sessions m ON m.old_id = dr.session_id
+    '''),
+]
+
+
+def connect_read_only(db_path):
+    """Open a database that must not be changed, or created when it does not exist"""
+    return sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True)
+
+
+def source_files(db_path):
+    """
+    A tracker database followed by its monthly archives, as paths relative to its folder.
+    Raises FileNotFoundError when the database or any archive in its catalog is missing.
+    """
+    if not os.path.isfile(db_path):
+        raise FileNotFoundError(f"Database not found: {db_path}")
+    conn = connect_read_only(db_path)
+    try:
+        has_catalog = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'archives'").fetchone()
+        archives = conn.execute('SELECT month, path FROM archives ORDER BY month').fetchall() if has_catalog else []
+    finally:
+        conn.close()
+    db_dir = os.path.dirname(os.path.abspath(db_path))
+    for month, path in archives:
+        if not os.path.isfile(os.path.join(db_dir, path)):
+            raise FileNotFoundError(f"Archive for {month} of {db_path} is missing: {os.path.join(db_dir, path)}")
+    return [os.path.basename(db_path)] + [path for _, path in archives]
+
+
+def stage_source(db_path, files, staging_dir):
+    """
+    Copy a database and its archives into staging_dir, keeping their layout, and bring
+    the copies to the current schema; the originals are only ever opened read-only.
+    Returns the paths of the copies.
+    """
+    db_dir = os.path.dirname(os.path.abspath(db_path))
+    copies = []
+    for path in files:
+        copy = os.path.join(staging_dir, path)
+        os.makedirs(os.path.dirname(copy), exist_ok=True)
+        source, target = connect_read_only(os.path.join(db_dir, path)), sqlite3.connect(copy)
+        try:
+            # The backup API takes a consistent snapshot even while the other tracker is writing
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+        copies.append(copy)
+
+    conn = sqlite3.connect(copies[0])
+    tracks_closing = 'closed' in [row[1] for row in conn.execute('PRAGMA table_info(sessions)')]
+    conn.close()
+    init_database(copies[0])
+    # Startup on the other machine would close every session but the one that may still be running;
+    # a version that never marked sessions closed has no running session to leave out
+    conn = sqlite3.connect(copies[0])
+    with conn:
+        conn.execute(f"UPDATE sessions SET closed = 1 WHERE NOT closed{' AND id < (SELECT MAX(id) FROM sessions)' if tracks_closing else ''}")
+    conn.close()
+    return copies
+
+
+def merge_databases(db_path, source_paths):
+    """
+    Copy the closed sessions of other tracker databases (and their archives) into db_path,
+    with their tasks, subtasks, window samples and reports, plus any task templates it lacks.
+
+    Sources are never written to: each one is copied and migrated in a temporary folder,
+    and a missing source or archive fails the merge before anything is changed.
+    Every table is copied with one INSERT ... SELECT per source file, renumbering ids
+    through temp mapping tables. Sessions whose content hash is already in the target
+    or its archives are skipped, so merging the same files again changes nothing.
+    Returns (sessions merged, duplicates skipped, open sessions skipped).
+    """
+    sources = [(source_path, source_files(source_path)) for source_path in source_paths
+               if not (os.path.exists(source_path) and os.path.exists(db_path) and os.path.samefile(source_path, db_path))]
+    init_database(db_path)
+    conn = connect_db(db_path)
+    try:
+        conn.execute('CREATE TEMP TABLE merge_hashes (hash TEXT PRIMARY KEY)')
+        next_ids = {table: 0 for table, _ in MERGE_STATEMENTS}
+        for schema in history_schemas(conn):
+            with conn:
+                conn.execute(f'INSERT OR IGNORE INTO temp.merge_hashes SELECT {SESSION_CONTENT_HASH.format(schema=schema)} FROM {schema}.sessions s')
+            for table in next_ids:
+                next_ids[table] = max(next_ids[table], conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {schema}.{table}').fetchone()[0])
+
+        merged = duplicates = still_open = 0
+        for source_path, files in sources:
+            with tempfile.TemporaryDirectory() as staging_dir:
+                for path in stage_source(source_path, files, staging_dir):
+                    conn.execute('ATTACH DATABASE ? AS source', (path,))
+                    try:
+                        with conn:
+                            conn.execute(f'''
+                                CREATE TEMP TABLE merge_sessions AS
+                                SELECT old_id, ? + ROW_NUMBER() OVER (ORDER BY old_id) AS new_id, hash FROM (
+                                    SELECT MIN(s.id) AS old_id, {SESSION_CONTENT_HASH.format(schema='source')} AS hash
+                                    FROM source.sessions s WHERE s.closed GROUP BY hash
+                                ) WHERE hash NOT IN (SELECT hash FROM temp.merge_hashes)
+                            ''', (next_ids['sessions'],))
+                            conn.execute('''
+                                CREATE TEMP TABLE merge_tasks AS
+                                SELECT st.id AS old_id, ? + ROW_NUMBER() OVER (ORDER BY st.id) AS new_id, m.new_id AS session_id
+                                FROM source.current_session_tasks st JOIN temp.merge_sessions m ON m.old_id = st.session_id
+                            ''', (next_ids['session_tasks'],))
+                            conn.execute('''
+                                INSERT OR IGNORE INTO main.window_titles (title)
+                                SELECT DISTINCT COALESCE(ws.title, '') FROM source.window_samples ws
+                                JOIN temp.merge_tasks t ON t.old_id = ws.session_task_id
+                            ''')
+                            for table, statement in MERGE_STATEMENTS:
+                                conn.execute(statement, {'offset': next_ids[table]})
+                                next_ids[table] = max(next_ids[table], conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM main.{table}').fetchone()[0])
+
+                            conn.execute('''
+                                INSERT INTO main.task_templates (name, default_minutes)
+                                SELECT DISTINCT name, default_minutes FROM source.task_templates t
+                                WHERE NOT EXISTS (SELECT 1 FROM main.task_templates m WHERE m.name = t.name AND m.default_minutes = t.default_minutes)
+                            ''')
+                            record_task_stats(conn, 's.id IN (SELECT new_id FROM temp.merge_sessions)')
+                            conn.execute('INSERT INTO temp.merge_hashes SELECT hash FROM temp.merge_sessions')
+
+                            new, closed, opened = conn.execute('''
+                                SELECT (SELECT COUNT(*) FROM temp.merge_sessions),
+                                       (SELECT COUNT(*) FROM source.sessions WHERE closed),
+                                       (SELECT COUNT(*) FROM source.sessions WHERE NOT closed)
+                            ''').fetchone()
+                            merged += new
+                            duplicates += closed - new
+                            still_open += opened
+                            conn.execute('DROP TABLE temp.merge_sessions')
+                            conn.execute('DROP TABLE temp.merge_tasks')
+                    finally:
+                        conn.execute('DETACH DATABASE source')
+
+        if merged:
+            # Sessions merged into months the target already archived go to those archives, which rebuild their rollup;
+            # the rest of the rollup is rebuilt here
+            after_days = json.loads((conn.execute("SELECT value FROM settings WHERE key = 'archive_after_days'").fetchone() or ['null'])[0])
+            cutoff = archive_cutoff(datetime.now().date(), ARCHIVE_AFTER_DAYS if after_days is None else after_days)
+            (last_archived,) = conn.execute('SELECT MAX(last_day) FROM archives').fetchone()
+            if last_archived:
+                month_start = datetime.strptime(last_archived[:10], '%Y-%m-%d').date().replace(day=1)
+                cutoff = max(cutoff, (month_start + timedelta(days=32)).replace(day=1))
+            conn.close()
+            archive_sessions(db_path, cutoff)
+            conn = connect_db(db_path)
+            with conn:
+                refresh_daily_rollup(conn)
+        return merged, duplicates, still_open
+    finally:
+        conn.close()
+
+
+# --- Task Estimates ---
+TASK_STATS_EWMA_ALPHA = 0.3
+SKETCH_GAMMA = 1.1
+SKETCH_MAX_BUCKETS = 64
+SUGGESTION_LIMIT = 5
+
+TaskEstimate = namedtuple('TaskEstimate', 'name count mean_seconds ewma_seconds p50_seconds p90_seconds')
+
+
+class QuantileSketch:
+    """
+    Log-bucketed histogram of durations (DDSketch style). Quantiles come back within
+    about 5% of the true value, from a few dozen counters however many values were added.
+    """
+
+    def __init__(self, buckets=None):
+        self.buckets = buckets or {}
+
+    def add(self, value):
+        index = math.ceil(math.log(max(value, 1.0), SKETCH_GAMMA))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        if len(self.buckets) > SKETCH_MAX_BUCKETS:
+            # Fold the two shortest buckets together; the low end matters least for planning
+            lowest, second = sorted(self.buckets)[:2]
+            self.buckets[second] += self.buckets.pop(lowest)
+
+    def quantile(self, q):
+        total = sum(self.buckets.values())
+        if not total:
+            return 0.0
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return 2 * SKETCH_GAMMA ** index / (SKETCH_GAMMA + 1)
+        return 2 * SKETCH_GAMMA ** max(self.buckets) / (SKETCH_GAMMA + 1)
+
+    def to_json(self):
+        return json.dumps(self.buckets, sort_keys=True)
+
+    @classmethod
+    def from_json(cls, text):
+        return cls({int(index): count for index, count in json.loads(text).items()})
+
+
+def task_key(name):
+    """Task names are matched ignoring case and extra whitespace"""
+    return ' '.join(name.split()).casefold()
+
+
+def record_task_stats(conn, session_filter, params=()):
+    """
+    Fold the tasks of the matching sessions into task_stats, oldest session first.
+    Each session counts once per task name; tasks that were never worked on are skipped.
+    Callers must pass each session only once, when it closes.
+    """
+    rows = conn.execute(f'''
+        SELECT st.session_id, st.task_name, SUM(st.actual_seconds)
+        FROM current_session_tasks st
+        JOIN sessions s ON s.id = st.session_id
+        WHERE {session_filter}
+        GROUP BY st.session_id, st.task_name
+        HAVING SUM(st.actual_seconds) > 0
+        ORDER BY s.start_time, st.session_id
+    ''', params).fetchall()
+
+    observations = {}
+    for session_id, name, seconds in rows:
+        key = (session_id, task_key(name))
+        observations[key] = (name.strip(), observations.get(key, (None, 0))[1] + seconds)
+
+    stats = {}
+    for (session_id, key), (name, seconds) in observations.items():
+        if key not in stats:
+            row = conn.execute('SELECT count, mean_seconds, ewma_seconds, sketch FROM task_stats WHERE name_key = ?', (key,)).fetchone()
+            stats[key] = [name, row[0], row[1], row[2], QuantileSketch.from_json(row[3])] if row else [name, 0, 0.0, 0.0, QuantileSketch()]
+        entry = stats[key]
+        entry[0] = name
+        entry[1] += 1
+        entry[2] += (seconds - entry[2]) / entry[1]
+        entry[3] = seconds if entry[1] == 1 else entry[3] + TASK_STATS_EWMA_ALPHA * (seconds - entry[3])
+        entry[4].add(seconds)
+
+    conn.executemany('''
+        INSERT OR REPLACE INTO task_stats (name_key, name, count, mean_seconds, ewma_seconds, sketch)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(key, name, count, mean, ewma, sketch.to_json()) for key, (name, count, mean, ewma, sketch) in stats.items()])
+
+
+class TaskEstimator:
+    """
+    Per-name duration statistics loaded once from task_stats, with a sorted key
+    index so prefix lookups while typing are a binary search.
+    """
+
+    def __init__(self, rows):
+        self.estimates = {}
+        for key, name, count, mean, ewma, sketch in rows:
+            sketch = QuantileSketch.from_json(sketch)
+            self.estimates[key] = TaskEstimate(name, count, mean, ewma, sketch.quantile(0.5), sketch.quantile(0.9))
+        self.keys = sorted(self.estimates)
+
+    @classmethod
+    def from_db(cls, db_path):
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute('SELECT name_key, name, count, mean_seconds, ewma_seconds, sketch FROM task_stats').fetchall()
+        conn.close()
+        return cls(rows)
+
+    def lookup(self, name):
+        return self.estimates.get(task_key(name))
+
+    def suggest(self, prefix, limit=SUGGESTION_LIMIT):
+        """Estimates for names starting with prefix, most frequent first"""
+        key = task_key(prefix)
+        if not key:
+            return []
+        start = bisect.bisect_left(self.keys, key)
+        end = bisect.bisect_left(self.keys, key + '\uffff', start)
+        matches = (self.estimates[k] for k in self.keys[start:end])
+        return heapq.nsmallest(limit, matches, key=lambda e: (-e.count, e.name))
+
+
+def suggested_minutes(estimate):
+    """Planned minutes for a task, leaning on recent sessions and rounded to 5 minutes"""
+    return max(5, 5 * round(estimate.ewma_seconds / 300))
+
+
+# --- Window Classification ---
+DEFAULT_CLASSIFIER_RULES = [
+    {"match": "regex", "pattern": r"\bjira\b", "category": "browser: Jira"},
+    {"match": "substring", "pattern": "Visual Studio", "category": "IDE"},
+    {"match": "substring", "pattern": "PyCharm", "category": "IDE"},
+    {"match": "substring", "pattern": "IntelliJ IDEA", "category": "IDE"},
+    {"match": "glob", "pattern": "Zoom*Meeting*", "category": "meetings"},
+    {"match": "substring", "pattern": "Microsoft Teams", "category": "meetings"},
+    {"match": "substring", "pattern": "Google Meet", "category": "meetings"},
+    {"match": "substring", "pattern": "Slack", "category": "chat"},
+    {"match": "substring", "pattern": "Outlook", "category": "email"},
+    {"match": "substring", "pattern": "Gmail", "category": "email"},
+    {"match": "glob", "pattern": "* - Google Chrome", "category": "browser"},
+    {"match": "glob", "pattern": "* - Mozilla Firefox", "category": "browser"},
+    {"match": "glob", "pattern": "* - Microsoft*Edge", "category": "browser"},
+    {"match": "glob", "pattern": "* - Brave", "category": "browser"},
+]
+
+
+def _literal_trie_regex(literals):
+    """Build one regex matching any of the literals, factored as a trie so matching is one pass in C"""
+    trie = {}
+    for literal in literals:
+        node = trie
+        for ch in literal:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Optional tails are greedy, so each match is the longest literal starting at that position
+        return f'(?:{body})?' if '' in node else body
+
+    # The lookahead makes finditer report a match at every position, so overlapping literals are found
+    return re.compile('(?=(' + build(trie) + '))', re.DOTALL)
+
+
+class WindowClassifier:
+    """
+    Maps window titles to categories with user rules ("substring", "glob" or "regex").
+
+    Rules are checked in file order and the first match wins. Every substring
+    rule, plus the longest literal of each glob, is compiled into one trie-shaped
+    regex, so a single scan of the title finds all literal hits at once. Only the
+    globs and regexes that could still match are then tried one by one. Results are
+    memoised in an LRU cache, since the same titles come back again and again.
+    Titles no rule matches fall back to their application name.
+    """
+
+    def __init__(self, rules, cache_size=CLASSIFIER_CACHE_SIZE):
+        self.rules = list(rules)
+        self._matchers = []
+        literal_rules = {}
+        self._always_check = []
+        regex_patterns = []
+        for index, rule in enumerate(self.rules):
+            kind, pattern = rule.get('match', 'substring'), rule['pattern']
+            if kind == 'substring':
+                self._matchers.append(None)
+                literal_rules.setdefault(pattern.lower(), []).append(index)
+            elif kind == 'glob':
+                self._matchers.append(re.compile(fnmatch.translate(pattern), re.IGNORECASE).match)
+                # Bracket expressions match one character of a set, so none of their text is required
+                literal = max(re.split(r'\[[^\]]*\]|[*?]', pattern), key=len).lower()
+                if literal:
+                    literal_rules.setdefault(literal, []).append(index)
+                else:
+                    self._always_check.append(index)
+            elif kind == 'regex':
+                compiled = re.compile(pattern, re.IGNORECASE)
+                self._matchers.append(compiled.search)
+                self._always_check.append(index)
+                # Group numbers and back-references shift once patterns are combined, so those stay out of the gate
+                if not compiled.groups:
+                    regex_patterns.append((index, pattern))
+            else:
+                raise ValueError(f"Unknown rule type {kind!r} in rule {index + 1}")
+
+        # A literal match also implies a match for every literal that is a prefix of it
+        self._rules_for_literal = {
+            literal: sorted({index for prefix, indexes in literal_rules.items() if literal.startswith(prefix) for index in indexes})
+            for literal in literal_rules
+        }
+        self._literal_regex = _literal_trie_regex(literal_rules) if literal_rules else None
+
+        # One alternation over all regex rules rejects most titles in a single search
+        self._regex_rules = [index for index, _ in regex_patterns]
+        try:
+            self._regex_gate = re.compile('|'.join(f'(?:{pattern})' for _, pattern in regex_patterns), re.IGNORECASE).search if regex_patterns else None
+        except re.error:
+            # e.g. inline flags, which are only allowed at the start of the whole expression
+            self._regex_gate = None
+        self.classify = functools.lru_cache(maxsize=cache_size)(self.classify_uncached)
+
+    @classmethod
+    def from_file(cls, path=CLASSIFIER_RULES_FILE):
+        """Load rules from a JSON file, falling back to the built-in rules if it is missing or invalid"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                return cls(json.load(f))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError, re.error) as e:
+            print(f"Invalid classifier rules in {path}: {e}")
+        return cls(DEFAULT_CLASSIFIER_RULES)
+
+    def classify_uncached(self, title):
+        title = title or ''
+        candidates = set(self._always_check)
+        if self._regex_gate is not None and not self._regex_gate(title):
+            candidates.difference_update(self._regex_rules)
+        if self._literal_regex is not None:
+            for match in self._literal_regex.finditer(title.lower()):
+                candidates.update(self._rules_for_literal[match.group(1)])
+
+        for index in sorted(candidates):
+            matcher = self._matchers[index]
+            if matcher is None or matcher(title):
+                return self.rules[index]['category']
+        return window_category(title)
+
+
+_classifier = None
+
+def get_classifier():
+    global _classifier
+    if _classifier is None:
+        _classifier = WindowClassifier.from_file()
+    return _classifier
+
+
+# --- Activity Timeline ---
+TIMELINE_PALETTE = ['#667eea', '#38b2ac', '#ed8936', '#9f7aea', '#48bb78', '#f56565', '#4299e1', '#ecc94b', '#ed64a6', '#0bc5ea']
+TIMELINE_STATE_COLORS = {'paused': '#cbd5e0', 'away': '#e2e8f0'}
+TIMELINE_LANES = [('task', 'Tasks'), ('window', 'Windows')]
+
+
+class ActivityTimeline:
+    """
+    Fixed-size histogram of what happened during a session, one row ("lane") per kind of activity.
+
+    Each lane holds at most `max_buckets` buckets of {value: seconds}. When a sample
+    lands past the last bucket, adjacent buckets are merged pairwise and the bucket
+    width doubles. Memory and rendering cost therefore stay constant however long the
+    session runs or however many samples it records.
+    """
+
+    def __init__(self, start, max_buckets=TIMELINE_BUCKETS, bucket_seconds=1.0, lanes=None):
+        self.start = start
+        self.max_buckets = max_buckets
+        self.bucket_seconds = bucket_seconds
+        self.lanes = lanes or {}
+
+    def record(self, lane, when, value, seconds=1):
+        offset = (when - self.start).total_seconds()
+        if offset < 0:
+            return
+        index = int(offset // self.bucket_seconds)
+        while index >= self.max_buckets:
+            self._coarsen()
+            index = int(offset // self.bucket_seconds)
+
+        buckets = self.lanes.setdefault(lane, [])
+        if len(buckets) <= index:
+            buckets.extend({} for _ in range(index + 1 - len(buckets)))
+        bucket = buckets[index]
+        bucket[value] = bucket.get(value, 0) + seconds
+
+    def _coarsen(self):
+        self.bucket_seconds *= 2
+        for lane, buckets in self.lanes.items():
+            merged = []
+            for i in range(0, len(buckets), 2):
+                bucket = dict(buckets[i])
+                if i + 1 < len(buckets):
+                    for value, seconds in buckets[i + 1].items():
+                        bucket[value] = bucket.get(value, 0) + seconds
+                merged.append(bucket)
+            self.lanes[lane] = merged
+
+    def to_dict(self):
+        return {'start': self.start.isoformat(), 'bucket_seconds': self.bucket_seconds, 'lanes': self.lanes}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(datetime.fromisoformat(data['start']), bucket_seconds=data['bucket_seconds'], lanes=data['lanes'])
+
+
+def timeline_color(value):
+    if value in TIMELINE_STATE_COLORS:
+        return TIMELINE_STATE_COLORS[value]
+    if value.startswith('task:'):
+        return TIMELINE_PALETTE[int(value[5:]) % len(TIMELINE_PALETTE)]
+    return TIMELINE_PALETTE[zlib.crc32(value.encode('utf-8')) % len(TIMELINE_PALETTE)]
+
+
+def render_timeline_svg(timeline, labels=None, width=900):
+    """
+    Draw a timeline dict (see ActivityTimeline.to_dict) as inline SVG. Each bucket
+    shows its dominant value and runs of equal buckets become one rectangle, so the
+    element count is bounded by the bucket count.
+    """
+    labels = labels or {}
+    bucket_count = max((len(buckets) for buckets in timeline['lanes'].values()), default=0)
+    if not bucket_count:
+        return ''
+
+    start = datetime.fromisoformat(timeline['start'])
+    bucket_seconds = timeline['bucket_seconds']
+    label_width, lane_height, top = 80, 22, 8
+    scale = (width - label_width) / bucket_count
+    elements = []
+    legend = {}
+
+    for row, (lane, lane_label) in enumerate(TIMELINE_LANES):
+        y = top + row * (lane_height + 6)
+        elements.append(f'<text x="0" y="{y + 15}" font-size="12" fill="#4a5568">{lane_label}</text>')
+        buckets = timeline['lanes'].get(lane, [])
+        run_value, run_start = None, 0
+        for i, bucket in enumerate(buckets + [{}]):
+            value = max(bucket, key=bucket.get) if bucket else None
+            if value == run_value:
+                continue
+            if run_value is not None:
+                name = labels.get(run_value, run_value.replace('task:', 'Task '))
+                run_from = start + timedelta(seconds=run_start * bucket_seconds)
+                run_to = start + timedelta(seconds=i * bucket_seconds)
+                elements.append(
+                    f'<rect x="{label_width + run_start * scale:.1f}" y="{y}" width="{(i - run_start) * scale:.1f}" '
+                    f'height="{lane_height}" fill="{timeline_color(run_value)}"><title>{html.escape(name)} '
+                    f'{run_from:%H:%M}–{run_to:%H:%M}</title></rect>'
+                )
+                legend[run_value] = legend.get(run_value, 0) + (i - run_start)
+            run_value, run_start = value, i
+
+    # Hour-aligned ticks, thinned out so there are never more than ~10
+    axis_y = top + len(TIMELINE_LANES) * (lane_height + 6) + 12
+    total_seconds = bucket_count * bucket_seconds
+    step = next((step for step in (900, 1800, 3600, 7200, 14400, 21600, 43200) if total_seconds / step <= 10), 86400)
+    tick = start.replace(minute=0, second=0, microsecond=0)
+    while tick <= start + timedelta(seconds=total_seconds):
+        if tick >= start:
+            x = label_width + (tick - start).total_seconds() / bucket_seconds * scale
+            elements.append(f'<text x="{x:.1f}" y="{axis_y}" font-size="10" fill="#718096" text-anchor="middle">{tick:%H:%M}</text>')
+        tick += timedelta(seconds=step)
+
+    legend_items = sorted(legend, key=legend.get, reverse=True)[:12]
+    legend_html = ''.join(
+        f'<span class="timeline-key"><span style="background: {timeline_color(value)}"></span>'
+        f'{html.escape(labels.get(value, value.replace("task:", "Task ")))}</span>'
+        for value in legend_items
+    )
+    height = axis_y + 6
+    return (f'<div class="timeline"><svg viewBox="0 0 {width} {height}" xmlns="http://www.w3.org/2000/svg">'
+            + ''.join(elements) + f'</svg><div class="timeline-legend">{legend_html}</div></div>')
+
+
+# --- Focus Analytics ---
+FOCUS_MAX_GAP_SECONDS = 3 * SAMPLE_INTERVAL_SECONDS  # a longer gap between samples (away, paused) ends a dwell
+FOCUS_RELATED_SHARE = 0.2  # categories with at least this share of a task's time are related to it
+FOCUS_MIN_STREAK_SECONDS = 5 * 60
+FOCUS_HALF_SWITCH_RATE = 30  # switches per hour that halve the focus score
+FOCUS_HISTORY_DAYS = 90
+DWELL_EDGES = (0, 30, 60, 120, 300, 600, 1800)
+DWELL_LABELS = ('<30s', '30s-1m', '1-2m', '2-5m', '5-10m', '10-30m', '30m+')
+UNIX_EPOCH = datetime(1970, 1, 1)
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+
+FocusStats = namedtuple('FocusStats', 'name tracked_seconds switches switch_rate median_dwell unrelated_share focus_score dwell_histogram')
+
+
+class FocusSamples:
+    """
+    Window samples as parallel NumPy arrays, ordered by task row and time.
+
+    Titles are integer ids and each task row maps to a group (its task name, or
+    whatever the caller groups by), so the analytics are array operations rather
+    than loops over samples.
+    """
+
+    def __init__(self, task, timestamp, title, title_categories, task_groups):
+        order = np.lexsort((timestamp, task))
+        self.task, self.timestamp, self.title = task[order], timestamp[order], title[order]
+        categories, groups = {}, {}
+        category_of_title = np.zeros(max(title_categories, default=-1) + 1, dtype=np.int64)
+        for title_id, category in title_categories.items():
+            category_of_title[title_id] = categories.setdefault(category, len(categories))
+        self.category = category_of_title[self.title]
+        task_rows, task_index = np.unique(self.task, return_inverse=True)
+        group_of_task = np.array([groups.setdefault(task_groups[row], len(groups)) for row in task_rows.tolist()], dtype=np.int64)
+        self.group = group_of_task[task_index]
+        self.categories = list(categories)
+        self.groups = list(groups)
+
+    def __len__(self):
+        return len(self.task)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (task row, group, epoch seconds, title, category) rows, e.g. a live session's samples"""
+        titles, title_categories, task_groups = {}, {}, {}
+        tasks, timestamps, title_ids = [], [], []
+        for task, group, timestamp, title, category in rows:
+            if title not in titles:
+                titles[title] = len(titles)
+                title_categories[titles[title]] = category
+            task_groups[task] = group
+            tasks.append(task)
+            timestamps.append(timestamp)
+            title_ids.append(titles[title])
+        return cls(np.array(tasks, dtype=np.int64), np.array(timestamps, dtype=np.float64),
+                   np.array(title_ids, dtype=np.int64), title_categories, task_groups)
+
+    @classmethod
+    def concatenate(cls, parts):
+        """Join the array parts of several databases, renumbering titles so their ids do not collide"""
+        tasks, timestamps, title_ids, title_categories, task_groups = [], [], [], {}, {}
+        for task, timestamp, title, categories, groups in parts:
+            offset = max(title_categories, default=-1) + 1
+            tasks.append(task)
+            timestamps.append(timestamp)
+            title_ids.append(title + offset)
+            title_categories.update((title_id + offset, category) for title_id, category in categories.items())
+            task_groups.update(groups)
+        return cls(np.concatenate(tasks or [np.zeros(0, dtype=np.int64)]),
+                   np.concatenate(timestamps or [np.zeros(0)]),
+                   np.concatenate(title_ids or [np.zeros(0, dtype=np.int64)]), title_categories, task_groups)
+
+
+def parse_id_list(text):
+    """Integers from a group_concat result"""
+    return np.fromstring(text or '', dtype=np.int64, sep=',')
+
+
+def fetch_focus_arrays(conn, task_filter, params, schema='main', group='st.task_name'):
+    """Samples of the task rows matching task_filter as (task, timestamp, title id, categories by title id, groups by task row)"""
+    tasks = f'''
+        FROM {schema}.current_session_tasks st JOIN {schema}.sessions s ON s.id = st.session_id
+        WHERE {task_filter}
+    '''
+    task_groups = dict(conn.execute(f'SELECT st.id, {group} {tasks}', params).fetchall())
+    task_ids, timestamps, title_ids = conn.execute(f'''
+        SELECT group_concat(ws.session_task_id),
+               group_concat(IFNULL(CAST((julianday(ws.timestamp) - {UNIX_EPOCH_JULIAN_DAY}) * 86400 AS INTEGER), 0)),
+               group_concat(IFNULL(ws.title_id, 0))
+        FROM {schema}.window_samples ws
+        WHERE ws.session_task_id IN (SELECT st.id {tasks})
+    ''', params).fetchone()
+    title_ids = parse_id_list(title_ids)
+    present = np.unique(title_ids).tolist()
+    titles = dict(conn.execute(f'SELECT id, title FROM {schema}.window_titles WHERE id IN (SELECT value FROM json_each(?))',
+                               (json.dumps(present),)))
+    classifier = get_classifier()
+    title_categories = {title_id: classifier.classify(titles.get(title_id, '')) for title_id in present}
+    return parse_id_list(task_ids), parse_id_list(timestamps), title_ids, title_categories, task_groups
+
+
+def load_focus_samples(conn, start_day, end_day):
+    """Samples of the sessions started between start_day and end_day, including archived months"""
+    return FocusSamples.concatenate(
+        fetch_focus_arrays(conn, "s.start_time >= ? AND s.start_time < date(?, '+1 day')", (str(start_day), str(end_day)), schema)
+        for schema in history_schemas(conn, start_day, end_day)
+    )
+
+
+def grouped_median(groups, values, group_count):
+    """Median of values within each group, 0 for empty groups"""
+    sorted_values = values[np.lexsort((values, groups))]
+    counts = np.bincount(groups, minlength=group_count)
+    starts = np.cumsum(counts) - counts
+    present = counts > 0
+    medians = np.zeros(group_count)
+    medians[present] = (sorted_values[(starts + (counts - 1) // 2)[present]] + sorted_values[(starts + counts // 2)[present]]) / 2
+    return medians
+
+
+def focus_stats(samples, by=None):
+    """
+    Focus statistics per group, as (per-group list, total).
+
+    Consecutive samples of one task row continue a stretch unless more than
+    FOCUS_MAX_GAP_SECONDS apart. Within a stretch, a title change is a switch and
+    a run of one title is a dwell. A group's related categories are those holding
+    at least FOCUS_RELATED_SHARE of its samples. The focus score starts from the
+    share of its time spent in unbroken runs of related windows lasting at least
+    FOCUS_MIN_STREAK_SECONDS, and is scaled by H / (H + switches per hour) with H
+    = FOCUS_HALF_SWITCH_RATE, so a task that only uses related windows but hops
+    between them still loses focus. With by, a function mapping a group to a larger unit
+    (e.g. task row to session), the total is a dict of stats per unit instead.
+    """
+    count = len(samples)
+    if not count:
+        return [], {} if by else None
+    group_count, category_count = len(samples.groups), len(samples.categories)
+    group, category = samples.group, samples.category
+
+    continues = np.zeros(count, dtype=bool)
+    continues[1:] = (samples.task[1:] == samples.task[:-1]) & (np.diff(samples.timestamp) <= FOCUS_MAX_GAP_SECONDS)
+    title_changes = np.zeros(count, dtype=bool)
+    title_changes[1:] = samples.title[1:] != samples.title[:-1]
+    switches = continues & title_changes
+
+    dwell_starts = np.flatnonzero(~continues | title_changes)
+    dwell_seconds = np.diff(np.append(dwell_starts, count)) * SAMPLE_INTERVAL_SECONDS
+    dwell_bins = np.searchsorted(DWELL_EDGES, dwell_seconds, side='right') - 1
+
+    group_samples = np.bincount(group, minlength=group_count)
+    category_samples = np.bincount(group * category_count + category, minlength=group_count * category_count)
+    related = category_samples.reshape(group_count, category_count) >= FOCUS_RELATED_SHARE * group_samples[:, None]
+    on_task = related[group, category]
+
+    streak_breaks = ~continues
+    streak_breaks[1:] |= on_task[1:] != on_task[:-1]
+    streak_starts = np.flatnonzero(streak_breaks)
+    streak_lengths = np.diff(np.append(streak_starts, count))
+    focused_streaks = on_task[streak_starts] & (streak_lengths * SAMPLE_INTERVAL_SECONDS >= FOCUS_MIN_STREAK_SECONDS)
+
+    def aggregate(key, names):
+        """Stats with samples keyed by key, an array of indexes into names"""
+        size, bins = len(names), len(DWELL_EDGES)
+        sample_counts = np.bincount(key, minlength=size)
+        switch_counts = np.bincount(key[switches], minlength=size)
+        unrelated = sample_counts - np.bincount(key[on_task], minlength=size)
+        focused = np.bincount(key[streak_starts][focused_streaks], weights=streak_lengths[focused_streaks], minlength=size)
+        dwell_key = key[dwell_starts]
+        medians = grouped_median(dwell_key, dwell_seconds, size)
+        histograms = np.bincount(dwell_key * bins + dwell_bins, minlength=size * bins).reshape(size, bins)
+        tracked = sample_counts * SAMPLE_INTERVAL_SECONDS
+        switch_rates = switch_counts * 3600 / np.maximum(tracked, 1)
+        scores = focused / np.maximum(sample_counts, 1) * FOCUS_HALF_SWITCH_RATE / (FOCUS_HALF_SWITCH_RATE + switch_rates)
+        return [FocusStats(name, int(tracked[k]), int(switch_counts[k]), float(switch_rates[k]),
+                           float(medians[k]), float(unrelated[k] / sample_counts[k]), float(scores[k]),
+                           histograms[k].tolist())
+                for k, name in enumerate(names) if sample_counts[k]]
+
+    per_group = aggregate(group, samples.groups)
+    if by is None:
+        return per_group, aggregate(np.zeros(count, dtype=np.int64), [None])[0]
+    units = {}
+    unit_of_group = np.array([units.setdefault(by(name), len(units)) for name in samples.groups], dtype=np.int64)
+    return per_group, {focus.name: focus for focus in aggregate(unit_of_group[group], list(units))}
+
+
+def focus_summary(focus):
+    return (f"focus {focus.focus_score:.0%} · {focus.switch_rate:.0f} switches/h · "
+            f"median dwell {focus.median_dwell / 60:.1f} min · {focus.unrelated_share:.0%} unrelated")
+
+
+def render_dwell_histogram(histogram):
+    peak = max(histogram) or 1
+    bars = ''.join(
+        f'<div class="dwell-bar" title="{label}: {n}"><span style="height: {n / peak * 40:.0f}px"></span><small>{label}</small></div>'
+        for label, n in zip(DWELL_LABELS, histogram)
+    )
+    return f'<div class="dwell-histogram">{bars}</div>'
+
+
+def dwell_sparkline(histogram):
+    peak = max(histogram) or 1
+    return ''.join('▁▂▃▄▅▆▇█'[min(7, n * 8 // peak)] if n else ' ' for n in histogram)
+
+
+# --- Reports ---
+BATCH_CHUNK_SIZE = 64
+HISTORY_PAGE_DAYS = 30
+
+REPORT_CSS = """
+    * { margin: 0; padding: 0; box-sizing: border-box; }
+    body {
+        font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Arial, sans-serif;
+        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        min-height: 100vh;
+        padding: 40px 20px;
+    }
+    .container { max-width: 1000px; margin: 0 auto; }
+    .header { background: white; padding: 40px; border-radius: 20px; margin-bottom: 30px; box-shadow: 0 20px 60px rgba(0,0,0,0.3); }
+    .header h1 { font-size: 36px; color: #2d3748; margin-bottom: 10px; }
+    .header .date { color: #718096; font-size: 16px; }
+    .stats { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 20px; margin-bottom: 30px; }
+    .stat-card { background: white; padding: 30px; border-radius: 15px; box-shadow: 0 10px 30px rgba(0,0,0,0.2); }
+    .stat-value { font-size: 48px; font-weight: bold; color: #667eea; margin-bottom: 10px; }
+    .stat-label { color: #718096; font-size: 14px; text-transform: uppercase; letter-spacing: 1px; }
+    .tasks-section { background: white; padding: 40px; border-radius: 20px; box-shadow: 0 20px 60px rgba(0,0,0,0.3); }
+    .task-item { padding: 25px; border-bottom: 1px solid #e2e8f0; }
+    .task-item:last-child { border-bottom: none; }
+    .task-header { display: flex; justify-content: space-between; align-items: center; margin-bottom: 15px; }
+    .task-name { font-size: 20px; font-weight: bold; color: #2d3748; }
+    .task-status { padding: 6px 12px; border-radius: 20px; font-size: 12px; font-weight: bold; }
+    .status-completed { background: #c6f6d5; color: #22543d; }
+    .status-exceeded { background: #fed7d7; color: #742a2a; }
+    .status-good { background: #bee3f8; color: #2c5282; }
+    .task-times { display: flex; gap: 30px; margin-bottom: 15px; color: #4a5568; }
+    .progress-bar { width: 100%; height: 12px; background: #e2e8f0; border-radius: 10px; overflow: hidden; margin-bottom: 15px; }
+    .progress-fill { height: 100%; background: linear-gradient(90deg, #667eea, #764ba2); border-radius: 10px; }
+    .progress-exceeded { background: linear-gradient(90deg, #fc8181, #f56565) !important; }
+    .subtasks, .processes, .resources { background: #f7fafc; padding: 15px; border-radius: 10px; font-size: 13px; color: #4a5568; margin-top: 15px; }
+    .subtasks-title, .processes-title, .resources-title { font-weight: bold; margin-bottom: 8px; color: #2d3748; }
+    .subtask-item, .process-item { padding: 5px 0; border-bottom: 1px solid #e2e8f0; }
+    .subtask-item:last-child, .process-item:last-child { border-bottom: none; }
+    .subtask-item.completed { text-decoration: line-through; color: #a0aec0; }
+    .session-section { margin-bottom: 30px; }
+    .session-summary { color: #718096; margin: -20px 0 10px; }
+    .timeline svg { width: 100%; height: auto; }
+    .timeline-legend { display: flex; flex-wrap: wrap; gap: 12px; font-size: 12px; color: #4a5568; margin-top: 8px; }
+    .timeline-key span { display: inline-block; width: 10px; height: 10px; border-radius: 2px; margin-right: 4px; }
+    .dwell-histogram { display: flex; gap: 6px; align-items: flex-end; margin-top: 10px; }
+    .dwell-bar { flex: 1; display: flex; flex-direction: column; align-items: center; }
+    .dwell-bar span { display: block; width: 100%; min-height: 1px; background: #667eea; border-radius: 3px 3px 0 0; }
+    .dwell-bar small { font-size: 10px; color: #718096; margin-top: 2px; }
+"""
+
+REPORT_PAGE_END = """
+    </div>
+</body>
+</html>"""
+
+
+def report_page_start(title, subtitle, stats):
+    """Everything up to the report body: document head, title card and stat cards"""
+    stat_cards = ''.join(
+        f'<div class="stat-card"><div class="stat-value">{value}</div><div class="stat-label">{label}</div></div>'
+        for value, label in stats
+    )
+    return f"""
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>{html.escape(title)}</title>
+    <style>{REPORT_CSS}</style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>⏱️ {html.escape(title)}</h1>
+            <div class="date">{html.escape(subtitle)}</div>
+        </div>
+        <div class="stats">{stat_cards}</div>
+"""
+
+
+def category_shares(categories):
+    """Top categories of a task as (category, share of samples) pairs"""
+    counts = {}
+    for category in categories:
+        counts[category] = counts.get(category, 0) + 1
+    total = sum(counts.values())
+    return [(category, count / total) for category, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)[:5]]
+
+
+def render_task_html(name, planned_minutes, actual_seconds, done, subtasks, recent_titles, usage, categories=(), focus=None):
+    actual_minutes = actual_seconds / 60
+    progress_percent = (actual_minutes / planned_minutes) * 100 if planned_minutes > 0 else 0
+    status = ('<span class="task-status status-completed">✓ Completed</span>' if done else 
+              '<span class="task-status status-exceeded">⚠️ Exceeded</span>' if progress_percent > 100 else 
+              '<span class="task-status status-good">✓ On Track</span>')
+    exceeded_class = 'progress-exceeded' if progress_percent > 100 else ''
+    
+    process_html = ""
+    if recent_titles:
+        process_html = '<div class="processes"><div class="processes-title">🖥️ Active Windows:</div>' + ''.join([f'<div class="process-item">• {html.escape(title[:60])}</div>' for title in recent_titles]) + '</div>'
+
+    categories_html = ""
+    if categories:
+        categories_html = ('<div class="processes"><div class="processes-title">🏷️ Categories:</div>'
+                           + ' · '.join(f'{html.escape(category)} {share:.0%}' for category, share in categories) + '</div>')
+
+    focus_html = ""
+    if focus:
+        focus_html = ('<div class="processes"><div class="processes-title">🎯 Focus:</div>'
+                      + html.escape(focus_summary(focus).capitalize()) + render_dwell_histogram(focus.dwell_histogram) + '</div>')
+
+    resources_html = ""
+    if usage and usage.get('samples'):
+        top = sorted(usage['processes'].items(), key=lambda item: item[1], reverse=True)[:3]
+        resources_html = (
+            '<div class="resources"><div class="resources-title">⚙️ Resources:</div>'
+            f'CPU {usage["cpu_seconds"]:.1f} s · Avg RAM {usage["rss_total"] / usage["samples"] / 2**20:.0f} MB · '
+            f'Peak RAM {usage["rss_peak"] / 2**20:.0f} MB'
+            + (' · Top: ' + ', '.join(f'{html.escape(process)} ({cpu:.1f} s)' for process, cpu in top) if top else '')
+            + '</div>'
+        )
+
+    subtasks_html = ""
+    if subtasks:
+        completed_count = sum(1 for s in subtasks if s['completed'])
+        subtasks_html = f'<div class="subtasks"><div class="subtasks-title">Subtasks ({completed_count}/{len(subtasks)})</div>' + ''.join([f'<div class="subtask-item {"completed" if s["completed"] else ""}">{"✓" if s["completed"] else "○"} {html.escape(s["name"])}</div>' for s in subtasks]) + '</div>'
+    
+    return f"""
+    <div class="task-item">
+        <div class="task-header"><div class="task-name">{html.escape(name)}</div>{status}</div>
+        <div class="task-times">
+            <div><strong>Planned:</strong> {planned_minutes:.0f} min</div>
+            <div><strong>Actual:</strong> {actual_minutes:.1f} min</div>
+            <div><strong>Difference:</strong> {actual_minutes - planned_minutes:+.1f} min</div>
+        </div>
+        <div class="progress-bar"><div class="progress-fill {exceeded_class}" style="width: {min(progress_percent, 100)}%"></div></div>
+        {subtasks_html}{categories_html}{focus_html}{process_html}{resources_html}
+    </div>"""
+
+
+def render_session_section(session):
+    start = datetime.fromisoformat(session['start_time'])
+    end = datetime.fromisoformat(session['end_time']) if session['end_time'] else None
+    heading = start.strftime('%A, %B %d, %Y · %I:%M %p') + (end.strftime(' – %I:%M %p') if end else '')
+    actual_minutes = sum(task['actual_seconds'] for task in session['tasks']) / 60
+    tasks_html = ''.join(
+        render_task_html(task['name'], task['minutes'], task['actual_seconds'], task['completed'],
+                         task['subtasks'], task['recent_titles'], task['resources'], task['categories'], task['focus'])
+        for task in session['tasks']
+    )
+    focus = f" · {html.escape(focus_summary(session['focus']))}" if session['focus'] else ''
+    timeline_html = ''
+    if session['timeline']:
+        labels = {f"task:{i}": task['name'] for i, task in enumerate(session['tasks'])}
+        timeline_html = render_timeline_svg(session['timeline'], labels)
+    return f"""
+        <div class="tasks-section session-section">
+            <h2 style="margin-bottom: 30px; color: #2d3748;">{heading}</h2>
+            <div class="session-summary">Planned {session['total_minutes'] or 0:.0f} min · Actual {actual_minutes:.1f} min · {len(session['tasks'])} tasks{focus}</div>
+            {timeline_html}
+            {tasks_html}
+        </div>"""
+
+
+def render_session_range(db_path, session_ids):
+    """
+    Process-pool entry point: load a chunk of sessions from db_path (the main database
+    or one of its archives) on a connection of its own and render them into one HTML string
+    """
+    conn = connect_db(db_path)
+    try:
+        return ''.join(render_session_section(session) for session in load_sessions(conn, session_ids))
+    finally:
+        conn.close()
+
+
+def load_sessions(conn, session_ids, schema='main'):
+    """Session dicts with their tasks, samples, focus and timeline, in start order"""
+    placeholders = ','.join('?' * len(session_ids))
+    rows = conn.execute(f'''
+        SELECT id, total_minutes, start_time, end_time, timeline FROM {schema}.sessions
+        WHERE id IN ({placeholders}) ORDER BY start_time
+    ''', list(session_ids)).fetchall()
+
+    sessions = {}
+    for session_id, total_minutes, start_time, end_time, timeline in rows:
+        sessions[session_id] = {'id': session_id, 'total_minutes': total_minutes, 'start_time': start_time,
+                                'end_time': end_time, 'timeline': json.loads(timeline) if timeline else None, 'tasks': [],
+                                'focus': None}
+
+    tasks = {}
+    task_session = {}
+    task_index = {}
+    for task_id, session_id, name, planned, actual, completed, resources in conn.execute(f'''
+        SELECT id, session_id, task_name, planned_minutes, actual_seconds, completed, resources
+        FROM {schema}.current_session_tasks WHERE session_id IN ({placeholders})
+        ORDER BY session_id, position, id
+    ''', list(sessions)):
+        task = {'name': name, 'minutes': planned or 0, 'actual_seconds': actual or 0, 'completed': bool(completed),
+                'resources': json.loads(resources) if resources else None, 'subtasks': [], 'recent_titles': [],
+                'categories': [], 'focus': None}
+        tasks[task_id] = task
+        task_session[task_id] = session_id
+        task_index[task_id] = len(sessions[session_id]['tasks'])
+        sessions[session_id]['tasks'].append(task)
+
+    if tasks:
+        task_placeholders = ','.join('?' * len(tasks))
+        for task_id, name, completed in conn.execute(f'''
+            SELECT session_task_id, name, completed FROM {schema}.sub_tasks
+            WHERE session_task_id IN ({task_placeholders}) ORDER BY session_task_id, position, id
+        ''', list(tasks)):
+            tasks[task_id]['subtasks'].append({'name': name, 'completed': bool(completed)})
+
+        for task_id, title in conn.execute(f'''
+            SELECT session_task_id, title FROM (
+                SELECT session_task_id, title,
+                       ROW_NUMBER() OVER (PARTITION BY session_task_id ORDER BY timestamp DESC) AS recency
+                FROM {schema}.window_samples WHERE session_task_id IN ({task_placeholders})
+            ) WHERE recency <= 5
+        ''', list(tasks)):
+            tasks[task_id]['recent_titles'].append(title or '')
+
+        category_counts = {}
+        for task_id, category, samples in conn.execute(f'''
+            SELECT session_task_id, COALESCE(category, classify_title(title)), COUNT(*) FROM {schema}.window_samples
+            WHERE session_task_id IN ({task_placeholders}) GROUP BY 1, 2
+        ''', list(tasks)):
+            category_counts.setdefault(task_id, []).append((category, samples))
+        for task_id, counts in category_counts.items():
+            total = sum(samples for _, samples in counts)
+            tasks[task_id]['categories'] = [(category, samples / total) for category, samples in
+                                            sorted(counts, key=lambda item: item[1], reverse=True)[:5]]
+
+        samples = FocusSamples(*fetch_focus_arrays(conn, f'st.id IN ({task_placeholders})', list(tasks), schema, group='st.id'))
+        per_task, per_session = focus_stats(samples, by=task_session.get)
+        for focus in per_task:
+            tasks[focus.name]['focus'] = focus
+        for session_id, focus in per_session.items():
+            sessions[session_id]['focus'] = focus
+
+        # Sessions saved before timelines were recorded get one bucketed from their samples in SQL
+        missing = [session for session in sessions.values() if session['timeline'] is None]
+        if missing:
+            spans = {}
+            for session in missing:
+                start = datetime.fromisoformat(session['start_time'])
+                end = datetime.fromisoformat(session['end_time']) if session['end_time'] else start + timedelta(minutes=session['total_minutes'] or 60)
+                spans[session['id']] = max((end - start).total_seconds(), 1) / TIMELINE_BUCKETS
+                session['timeline'] = {'start': start.isoformat(), 'bucket_seconds': spans[session['id']],
+                                       'lanes': {'task': [{} for _ in range(TIMELINE_BUCKETS)],
+                                                 'window': [{} for _ in range(TIMELINE_BUCKETS)]}}
+            span_values = ','.join('(?, ?)' for _ in spans)
+            for session_id, task_id, bucket, category, samples in conn.execute(f'''
+                WITH spans (session_id, bucket_seconds) AS (VALUES {span_values})
+                SELECT st.session_id, st.id,
+                       CAST((julianday(ws.timestamp) - julianday(s.start_time)) * 86400 / spans.bucket_seconds AS INTEGER) AS bucket,
+                       COALESCE(ws.category, classify_title(ws.title)), COUNT(*)
+                FROM spans
+                JOIN {schema}.sessions s ON s.id = spans.session_id
+                JOIN {schema}.current_session_tasks st ON st.session_id = s.id
+                JOIN {schema}.window_samples ws ON ws.session_task_id = st.id
+                GROUP BY 1, 2, 3, 4
+            ''', [value for item in spans.items() for value in item]):
+                if bucket is None or not 0 <= bucket < TIMELINE_BUCKETS:
+                    continue
+                lanes = sessions[session_id]['timeline']['lanes']
+                seconds = samples * SAMPLE_INTERVAL_SECONDS
+                task_value = f"task:{task_index[task_id]}"
+                lanes['task'][bucket][task_value] = lanes['task'][bucket].get(task_value, 0) + seconds
+                lanes['window'][bucket][category] = lanes['window'][bucket].get(category, 0) + seconds
+
+    return list(sessions.values())
+
+
+def report_period(period, today=None):
+    """Resolve 'week', 'month' or 'YYYY-MM-DD:YYYY-MM-DD' into an inclusive (start, end) date pair"""
+    today = today or datetime.now().date()
+    if period == 'week':
+        return today - timedelta(days=today.weekday()), today
+    if period == 'month':
+        return today.replace(day=1), today
+    start, _, end = period.partition(':')
+    start_day = datetime.strptime(start.strip(), '%Y-%m-%d').date()
+    end_day = datetime.strptime(end.strip(), '%Y-%m-%d').date() if end.strip() else today
+    if end_day < start_day:
+        raise ValueError("Report range ends before it starts")
+    return start_day, end_day
+
+
+def render_batch_report(db_path, start_day, end_day, out_path, workers=None):
+    """
+    Render every stored session between start_day and end_day into one HTML file.
+    The parent only lists session ids; each chunk is loaded and rendered by a pool
+    worker on its own connection and written to disk in order as it finishes, so
+    memory stays bounded by the number of chunks in flight.
+    Returns the number of sessions rendered.
+    """
+    workers = workers or os.cpu_count() or 1
+    conn = connect_db(db_path)
+    try:
+        # The header adds up the sessions that are rendered, open ones included; the rollup only holds closed days
+        ranges = []
+        session_count = planned = actual_seconds = 0
+        for schema in history_schemas(conn, start_day, end_day):
+            schema_path = next(path for _, name, path in conn.execute('PRAGMA database_list') if name == schema)
+            session_ids = [session_id for (session_id,) in conn.execute(f'''
+                SELECT id FROM {schema}.sessions
+                WHERE start_time >= ? AND start_time < date(?, '+1 day')
+                ORDER BY start_time
+            ''', (str(start_day), str(end_day)))]
+            schema_planned, schema_actual = conn.execute(f'''
+                SELECT COALESCE(SUM(st.planned_minutes), 0), COALESCE(SUM(st.actual_seconds), 0)
+                FROM {schema}.current_session_tasks st JOIN {schema}.sessions s ON s.id = st.session_id
+                WHERE s.start_time >= ? AND s.start_time < date(?, '+1 day')
+            ''', (str(start_day), str(end_day))).fetchone()
+            session_count += len(session_ids)
+            planned += schema_planned
+            actual_seconds += schema_actual
+            ranges.append((schema_path, session_ids))
+
+        with open(out_path, 'w', encoding='utf-8') as out, ProcessPoolExecutor(max_workers=workers) as pool:
+            out.write(report_page_start(
+                "Time Tracking Report", f"{start_day:%B %d, %Y} – {end_day:%B %d, %Y}",
+                [(session_count, "Sessions"), (planned, "Planned Minutes"), (int(actual_seconds / 60), "Actual Minutes")]
+            ))
+
+            rendered = 0
+            in_flight = deque()
+            for schema_path, session_ids in ranges:
+                for offset in range(0, len(session_ids), BATCH_CHUNK_SIZE):
+                    chunk = session_ids[offset:offset + BATCH_CHUNK_SIZE]
+                    in_flight.append(pool.submit(render_session_range, schema_path, chunk))
+                    rendered += len(chunk)
+                    if len(in_flight) >= workers * 2:
+                        out.write(in_flight.popleft().result())
+            while in_flight:
+                out.write(in_flight.popleft().result())
+
+            if not rendered:
+                out.write('<div class="tasks-section">No sessions recorded in this period.</div>')
+            out.write(REPORT_PAGE_END)
+        return rendered
+    finally:
+        conn.close()
+
+
+REPORT_SUMMARY_COLUMNS = '''
+    dr.id, dr.report_date, dr.total_planned_minutes, dr.total_actual_minutes, dr.tasks_count,
+    dr.created_at, s.start_time, s.end_time
+'''
+
+
+def fetch_reports(conn, start_day, end_day):
+    """Report summaries between start_day and end_day, newest first, including archived months in range"""
+    reports = []
+    for schema in history_schemas(conn, start_day, end_day):
+        reports += conn.execute(f'''
+            SELECT {REPORT_SUMMARY_COLUMNS}
+            FROM {schema}.daily_reports dr JOIN {schema}.sessions s ON dr.session_id = s.id
+            WHERE dr.report_date BETWEEN ? AND ?
+        ''', (str(start_day), str(end_day))).fetchall()
+    return sorted(reports, key=lambda report: (report[1], report[6] or ''), reverse=True)
+
+
+def latest_report_day_before(conn, day):
+    """The most recent day before day that may have reports, looking at the catalog rather than the archives"""
+    candidates = conn.execute('''
+        SELECT MAX(report_date) FROM daily_reports WHERE report_date < ?
+        UNION ALL SELECT MAX(last_day) FROM archives WHERE last_day < ?
+    ''', (str(day), str(day))).fetchall()
+    days = [value for (value,) in candidates if value]
+    return datetime.strptime(max(days)[:10], '%Y-%m-%d').date() if days else None
+
+
+def search_reports(conn, text, start_day=None, end_day=None):
+    """Reports of sessions with a task or window title containing text; every archive in range is searched"""
+    pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    reports = []
+    for schema in history_schemas(conn, start_day, end_day):
+        reports += conn.execute(f'''
+            SELECT {REPORT_SUMMARY_COLUMNS}
+            FROM {schema}.daily_reports dr JOIN {schema}.sessions s ON dr.session_id = s.id
+            WHERE dr.session_id IN (
+                SELECT session_id FROM {schema}.session_tasks WHERE task_name LIKE ? ESCAPE '\\'
+                UNION
+                SELECT st.session_id FROM {schema}.session_tasks st
+                JOIN {schema}.window_samples ws ON ws.session_task_id = st.id
+                WHERE ws.title LIKE ? ESCAPE '\\'
+            )
+        ''', (pattern, pattern)).fetchall()
+    return sorted(reports, key=lambda report: (report[1], report[6] or ''), reverse=True)
+
+
+# --- Session Tracking ---
+SessionSnapshot = namedtuple('SessionSnapshot', 'session_id tasks current_task_index is_running away tracked_seconds')
+TaskSnapshot = namedtuple('TaskSnapshot', 'name minutes actual_seconds subtasks')
+
+EMPTY_SNAPSHOT = SessionSnapshot(None, (), 0, False, False, 0)
+
+
+class SystemClock:
+    """Wall clock and waiting for the tracker; simulations swap in a VirtualClock"""
+
+    def now(self):
+        return datetime.now()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def wait(self, seconds, wake):
+        """Wait up to seconds, returning early when the wake event is set"""
+        if wake.wait(seconds):
+            wake.clear()
+
+
+class WindowSampler:
+    """Reports the title of the foreground window"""
+
+    def active_title(self):
+        import pygetwindow as gw
+        active_window = gw.getActiveWindow()
+        return active_window.title if active_window else None
+
+
+class SessionTracker:
+    """
+    Session state and time accounting without any UI.
+
+    The clock, idle source, window sampler and resource sampler are injectable,
+    so the same code runs in the app and in headless simulations. UI layers
+    react through the on_* hooks.
+
+    Session state has a single owner: the tracking thread while it runs, the
+    caller otherwise. Other threads never touch it directly; they post commands,
+    which the owner applies in batches between ticks, and read the immutable
+    snapshot published after every change.
+    """
+
+    def __init__(self, db_path="time_tracker.db", clock=None, idle_source=None, window_sampler=None, resource_sampler=None):
+        self.db_path = db_path
+        self.clock = clock or SystemClock()
+        self.init_database()
+
+        self.total_minutes = 0
+        self.end_time = None
+        self.tasks = []
+        self.current_task_index = 0
+        self.is_running = False
+        self.elapsed_seconds = 0
+        self.session_start_time = None
+        self.session_id = None
+        self.process_tracking = {}
+        self.pending_samples = []
+        self.resource_usage = {}
+        self.timeline = None
+        self.window_sampler = window_sampler or WindowSampler()
+        self.resource_sampler = resource_sampler or ResourceSampler()
+        self.classifier = get_classifier()
+        self.reset_flush_state()
+
+        self.stop_tracking_flag = False
+        self.last_tick = None
+        self.tick_carry = 0.0
+        self.max_tick_credit_seconds = TICK_MAX_CREDIT_SECONDS
+        self.last_autosave = None
+        self.tracked_seconds = 0
+
+        self.commands = queue.SimpleQueue()
+        self.wake = threading.Event()
+        self.owner_lock = threading.Lock()
+        self.tracking_thread = None
+        self.tracking_active = False
+        self.snapshot = EMPTY_SNAPSHOT
+
+        self.idle_source = idle_source or IdleSource()
+        self.idle_threshold_seconds = int(self.get_setting('idle_threshold_seconds', IDLE_THRESHOLD_SECONDS))
+        self.idle_since = None
+        self.idle_counted_seconds = 0
+        self.idle_task_index = 0
+
+        self.close_stale_sessions()
+        archive_sessions(self.db_path, archive_cutoff(self.clock.now().date(), self.get_setting('archive_after_days', ARCHIVE_AFTER_DAYS)))
+
+    # Hooks for UI layers
+    def on_update(self):
+        """Called on the owning thread whenever a new snapshot has been published"""
+        pass
+
+    def on_idle_start(self):
+        pass
+
+    def on_idle_return(self, task_index, idle_span, counted):
+        """Called when the user comes back; without a UI to ask, the idle time is discarded"""
+        self.resolve_idle_span(task_index, idle_span, counted, keep=False)
+
+    def init_database(self):
+        init_database(self.db_path)
+
+    def get_setting(self, key, default=None):
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute('SELECT value FROM settings WHERE key = ?', (key,)).fetchone()
+        conn.close()
+        return json.loads(row[0]) if row else default
+
+    def set_setting(self, key, value):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+        conn.commit()
+        conn.close()
+
+    def set_idle_threshold(self, seconds):
+        self.idle_threshold_seconds = seconds
+        self.set_setting('idle_threshold_seconds', seconds)
+
+    # Command bus
+    def post(self, command, *args):
+        """
+        Queue a call to command(*args) on the thread that owns the session state.
+        Returns a Future with its result; commands run in the order they were posted.
+        """
+        future = Future()
+        self.commands.put((future, command, args))
+        self.wake.set()
+        # Without a tracking thread the caller becomes the owner; the lock keeps two callers from draining at once
+        if not self.tracking_active:
+            with self.owner_lock:
+                if self.drain_commands():
+                    self.publish()
+        return future
+
+    def drain_commands(self):
+        """Apply every queued command; returns how many ran. Only the owner of the state calls this."""
+        count = 0
+        while True:
+            try:
+                future, command, args = self.commands.get_nowait()
+            except queue.Empty:
+                return count
+            count += 1
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(command(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def publish(self):
+        self.snapshot = self.make_snapshot()
+        self.on_update()
+
+    def make_snapshot(self):
+        tasks = tuple(
+            TaskSnapshot(task['name'], task['minutes'], self.task_actual_seconds(i),
+                         tuple((subtask['name'], bool(subtask['completed'])) for subtask in task.get('subtasks', [])))
+            for i, task in enumerate(self.tasks)
+        )
+        return SessionSnapshot(self.session_id, tasks, self.current_task_index, self.is_running,
+                               self.idle_since is not None, self.tracked_seconds)
+
+    def start_tracking_thread(self):
+        self.tracking_active = True
+        self.tracking_thread = threading.Thread(target=self.tracking_loop, daemon=True)
+        self.tracking_thread.start()
+
+    def stop_tracking(self):
+        self.stop_tracking_flag = True
+
+    def start_session(self, tasks, total_minutes, end_time):
+        self.tasks = tasks
+        self.total_minutes = total_minutes
+        self.end_time = end_time
+
+        now = self.clock.now()
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO sessions (total_minutes, start_time) VALUES (?, ?)', (self.total_minutes, now))
+        self.session_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+
+        self.current_task_index = 0
+        self.elapsed_seconds = 0
+        self.session_start_time = now
+        self.is_running = True
+        self.process_tracking = {}
+        self.pending_samples = []
+        self.resource_usage = {}
+        self.idle_since = None
+        self.timeline = ActivityTimeline(self.session_start_time)
+        self.reset_flush_state()
+        self.stop_tracking_flag = False
+        self.last_tick = self.clock.monotonic()
+        self.tick_carry = 0.0
+        self.last_autosave = self.clock.monotonic()
+        self.tracked_seconds = 0
+        self.publish()
+
+    def tracking_loop(self):
+        try:
+            while not self.stop_tracking_flag:
+                self.clock.wait(self.tick(), self.wake)
+        finally:
+            # Hand ownership back to callers, then run anything posted while the loop was stopping
+            self.tracking_active = False
+            with self.owner_lock:
+                if self.drain_commands():
+                    self.publish()
+
+    def tick(self):
+        """Run one iteration of the tracking loop and return how long to wait before the next one"""
+        with self.owner_lock:
+            self.drain_commands()
+            if self.stop_tracking_flag:
+                self.publish()
+                return 0
+            step = self.track_tick()
+            self.publish()
+        return step
+
+    def track_tick(self):
+        now = self.clock.monotonic()
+        passed = self.seconds_since_tick(now)
+        self.last_tick = now
+
+        # An away span still has to be closed when the session was paused or resumed meanwhile
+        if self.is_running or self.idle_since is not None:
+            self.check_idle()
+
+        if self.is_running and self.idle_since is None:
+            before = self.elapsed_seconds
+            self.credit_seconds(passed)
+
+            if self.elapsed_seconds // SAMPLE_INTERVAL_SECONDS > before // SAMPLE_INTERVAL_SECONDS:
+                self.track_active_process()
+
+            if self.resource_sampler.due(now):
+                self.track_resources()
+        else:
+            # Time counts again from the first tick back; the fraction of a second already run is kept
+            self.last_tick = None
+
+        if self.last_autosave is None or now - self.last_autosave >= AUTOSAVE_SECONDS:
+            self.last_autosave = now
+            try:
+                self.flush_session()
+            except sqlite3.Error as e:
+                print(f"Autosave error: {e}")
+
+        # Back off while the user is away; nothing is counted or sampled until they return
+        step = IDLE_POLL_SECONDS if self.idle_since is not None else 1
+        state = 'paused' if not self.is_running else 'away' if self.idle_since is not None else f"task:{self.current_task_index}"
+        self.timeline.record('task', self.clock.now(), state, step)
+        return step
+
+    def seconds_since_tick(self, now):
+        """
+        Credit the time that actually passed rather than assuming each sleep lasted exactly a second,
+        but never more than a few seconds at once (e.g. after the machine was suspended)
+        """
+        return min(now - self.last_tick, self.max_tick_credit_seconds) if self.last_tick is not None else 0
+
+    def credit_seconds(self, passed):
+        """Add passed seconds to the current task, carrying the fraction of a second to the next call"""
+        self.tick_carry += passed
+        credited = int(self.tick_carry)
+        self.tick_carry -= credited
+        self.elapsed_seconds += credited
+        self.tracked_seconds += credited
+
+    def check_idle(self):
+        try:
+            idle = self.idle_source.idle_seconds()
+        except Exception as e:
+            print(f"Idle detection error: {e}")
+            return
+
+        if self.idle_since is None and idle >= self.idle_threshold_seconds:
+            self.idle_since = self.clock.now() - timedelta(seconds=idle)
+            # The seconds before the threshold was crossed were already counted as work
+            self.idle_counted_seconds = min(int(idle), self.elapsed_seconds)
+            self.idle_task_index = self.current_task_index
+            self.pending_samples = []
+            self.on_idle_start()
+        elif self.idle_since is not None and idle < self.idle_threshold_seconds:
+            idle_span = (self.clock.now() - timedelta(seconds=idle) - self.idle_since).total_seconds()
+            counted = self.idle_counted_seconds
+            task_index = self.idle_task_index
+            self.idle_since = None
+            self.on_idle_return(task_index, int(idle_span), counted)
+
+    def resolve_idle_span(self, task_index, idle_span, counted, keep):
+        if not (0 <= task_index < len(self.tasks)):
+            return
+        if keep:
+            self.adjust_task_seconds(task_index, idle_span - counted)
+        else:
+            self.adjust_task_seconds(task_index, -counted)
+        # A whole away span changes at once; save it on the next tick rather than at the next autosave
+        self.last_autosave = None
+
+    def adjust_task_seconds(self, task_index, delta):
+        before = self.task_actual_seconds(task_index)
+        after = max(0, before + delta)
+        if task_index == self.current_task_index:
+            self.elapsed_seconds = after
+        else:
+            self.tasks[task_index]['actual_seconds'] = after
+        self.tracked_seconds += after - before
+
+    def track_active_process(self):
+        try:
+            title = self.window_sampler.active_title()
+            if title is not None and self.current_task_index < len(self.tasks):
+                task_name = self.tasks[self.current_task_index]['name']
+                self.pending_samples.append((task_name, {'process': title, 'timestamp': self.clock.now().isoformat(),
+                                                         'category': self.classifier.classify(title)}))
+            # Samples stay pending until input proves the user was present; idle detection drops them otherwise
+            if self.idle_source.idle_seconds() < SAMPLE_INTERVAL_SECONDS:
+                self.commit_pending_samples()
+        except Exception as e:
+            print(f"Process tracking error: {e}")
+
+    def track_resources(self):
+        try:
+            result = self.resource_sampler.sample(self.clock.monotonic())
+            if result and self.current_task_index < len(self.tasks):
+                task_name = self.tasks[self.current_task_index]['name']
+                add_resource_sample(self.resource_usage.setdefault(task_name, {}), *result)
+        except Exception as e:
+            print(f"Resource tracking error: {e}")
+
+    def commit_pending_samples(self):
+        for task_name, sample in self.pending_samples:
+            self.process_tracking.setdefault(task_name, []).append(sample)
+            self.timeline.record('window', datetime.fromisoformat(sample['timestamp']), sample['category'], SAMPLE_INTERVAL_SECONDS)
+        self.pending_samples = []
+
+    def toggle_pause(self):
+        now = self.clock.monotonic()
+        if self.is_running and self.idle_since is None:
+            # Count the part of a tick that ran before the pause
+            self.credit_seconds(self.seconds_since_tick(now))
+        self.is_running = not self.is_running
+        # A resumed session counts from the moment of the resume, not from the last tick before the pause
+        self.last_tick = now if self.is_running else None
+
+    def switch_to_task(self, task_index):
+        if task_index == self.current_task_index or not (0 <= task_index < len(self.tasks)):
+            return False
+
+        if self.current_task_index < len(self.tasks):
+            self.tasks[self.current_task_index]['actual_seconds'] = self.elapsed_seconds
+
+        self.current_task_index = task_index
+        self.elapsed_seconds = self.tasks[task_index].get('actual_seconds', 0)
+        return True
+
+    def add_subtask(self, task_index, name):
+        self.tasks[task_index].setdefault('subtasks', []).append({'name': name, 'completed': False})
+
+    def toggle_subtask(self, task_index, subtask_index):
+        subtask = self.tasks[task_index]['subtasks'][subtask_index]
+        subtask['completed'] = not subtask['completed']
+
+    def delete_subtask(self, task_index, subtask_index):
+        self.tasks[task_index]['subtasks'].pop(subtask_index)
+
+    def close_session(self):
+        """Mark the finished session closed and fold it into the per-day rollup"""
+        if not self.session_id or not self.session_start_time:
+            return
+        conn = connect_db(self.db_path)
+        with conn:
+            if conn.execute('UPDATE sessions SET closed = 1 WHERE id = ? AND NOT closed', (self.session_id,)).rowcount:
+                record_task_stats(conn, 's.id = ?', (self.session_id,))
+            refresh_daily_rollup(conn, self.session_start_time.date())
+        conn.close()
+
+    def close_stale_sessions(self):
+        """Close sessions left open by a crash; their data is whatever the last autosave wrote"""
+        conn = connect_db(self.db_path)
+        with conn:
+            days = [day for (day,) in conn.execute(
+                'SELECT DISTINCT date(start_time) FROM sessions WHERE NOT closed AND start_time IS NOT NULL'
+            )]
+            record_task_stats(conn, 'NOT s.closed')
+            conn.execute('UPDATE sessions SET closed = 1 WHERE NOT closed')
+            for day in days:
+                refresh_daily_rollup(conn, day)
+        conn.close()
+
+    def task_actual_seconds(self, task_index):
+        if task_index == self.current_task_index:
+            return self.elapsed_seconds
+        return self.tasks[task_index].get('actual_seconds', 0)
+
+    def reset_flush_state(self):
+        self.flushed_tasks = {}
+        self.flushed_subtasks = {}
+        self.flushed_sample_counts = {}
+        self.task_row_ids = {}
+
+    def flush_session(self, report_html=None):
+        """
+        Persist the session in one transaction, writing only what changed since the last flush.
+        Tasks and subtasks are upserted by position, window samples are appended and the
+        report summary is kept as a single row per session.
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                cursor = conn.cursor()
+                for i, task in enumerate(self.tasks):
+                    row = (task['name'], task['minutes'], self.task_actual_seconds(i), i <= self.current_task_index,
+                           json.dumps(self.resource_usage.get(task['name'], {}), sort_keys=True))
+                    if self.flushed_tasks.get(i) != row:
+                        cursor.execute('''
+                            INSERT INTO session_tasks (session_id, position, task_name, planned_minutes, actual_seconds, completed, resources)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT (session_id, position) DO UPDATE SET
+                                task_name = excluded.task_name, planned_minutes = excluded.planned_minutes,
+                                actual_seconds = excluded.actual_seconds, completed = excluded.completed,
+                                resources = excluded.resources
+                        ''', (self.session_id, i) + row)
+                        self.flushed_tasks[i] = row
+
+                    if i not in self.task_row_ids:
+                        self.task_row_ids[i] = cursor.execute(
+                            'SELECT id FROM session_tasks WHERE session_id = ? AND position = ?', (self.session_id, i)
+                        ).fetchone()[0]
+                    task_row_id = self.task_row_ids[i]
+
+                    subtasks = [(subtask['name'], bool(subtask['completed'])) for subtask in task.get('subtasks', [])]
+                    if self.flushed_subtasks.get(i, []) != subtasks:
+                        cursor.executemany('''
+                            INSERT INTO sub_tasks (session_task_id, position, name, completed) VALUES (?, ?, ?, ?)
+                            ON CONFLICT (session_task_id, position) DO UPDATE SET name = excluded.name, completed = excluded.completed
+                        ''', [(task_row_id, pos, name, completed) for pos, (name, completed) in enumerate(subtasks)])
+                        cursor.execute('DELETE FROM sub_tasks WHERE session_task_id = ? AND position >= ?', (task_row_id, len(subtasks)))
+                        self.flushed_subtasks[i] = subtasks
+
+                # Samples are grouped by task name, so they attach to the first task row with that name
+                for task_name, samples in self.process_tracking.items():
+                    flushed = self.flushed_sample_counts.get(task_name, 0)
+                    positions = [i for i, task in enumerate(self.tasks) if task['name'] == task_name]
+                    if len(samples) > flushed and positions:
+                        cursor.executemany('INSERT OR IGNORE INTO window_titles (title) VALUES (?)',
+                                           [(sample['process'] or '',) for sample in samples[flushed:]])
+                        cursor.executemany('''
+                            INSERT INTO window_samples (session_task_id, timestamp, title, category, title_id)
+                            SELECT ?, ?, ?, ?, id FROM window_titles WHERE title = ?
+                        ''', [(self.task_row_ids[positions[0]], sample['timestamp'], sample['process'], sample.get('category'),
+                               sample['process'] or '') for sample in samples[flushed:]])
+                        self.flushed_sample_counts[task_name] = len(samples)
+
+                cursor.execute('UPDATE sessions SET end_time = ?, timeline = ? WHERE id = ?',
+                               (self.clock.now(), json.dumps(self.timeline.to_dict()), self.session_id))
+
+                if report_html is not None:
+                    total_actual_minutes = sum(self.task_actual_seconds(i) for i in range(len(self.tasks))) / 60
+                    cursor.execute('''
+                        INSERT INTO daily_reports (session_id, report_date, report_html, total_planned_minutes, total_actual_minutes, tasks_count)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (session_id) DO UPDATE SET
+                            report_date = excluded.report_date, report_html = excluded.report_html,
+                            total_planned_minutes = excluded.total_planned_minutes,
+                            total_actual_minutes = excluded.total_actual_minutes, tasks_count = excluded.tasks_count
+                    ''', (self.session_id, self.session_start_time.date(), report_html, self.total_minutes, total_actual_minutes, len(self.tasks)))
+        finally:
+            conn.close()
+
+    def save_report(self):
+        """Build the HTML report for the current session and persist it; returns the HTML"""
+        if self.idle_since is None:
+            self.commit_pending_samples()
+
+        html_content = self.create_html_report_content()
+        self.flush_session(html_content)
+        return html_content
+
+    def session_focus(self):
+        """Focus statistics per task name and for the whole session, from the samples committed so far"""
+        rows = [(position, name, (datetime.fromisoformat(sample['timestamp']) - UNIX_EPOCH).total_seconds(),
+                 sample['process'], sample.get('category') or self.classifier.classify(sample['process']))
+                for position, (name, samples) in enumerate(self.process_tracking.items()) for sample in samples]
+        return focus_stats(FocusSamples.from_rows(rows))
+
+    def create_html_report_content(self):
+        per_task, total = self.session_focus()
+        stats = [(int(self.total_minutes), "Planned Minutes"), (len(self.tasks), "Total Tasks"),
+                 (self.current_task_index + 1, "Tasks Worked On")]
+        if total:
+            stats.append((f"{total.focus_score:.0%}", "Focus Score"))
+        labels = {f"task:{i}": task['name'] for i, task in enumerate(self.tasks)}
+        body = ('<div class="tasks-section session-section"><h2 style="margin-bottom: 20px; color: #2d3748;">Timeline</h2>'
+                + render_timeline_svg(self.timeline.to_dict(), labels) + '</div>'
+                + '<div class="tasks-section"><h2 style="margin-bottom: 30px; color: #2d3748;">Task Details</h2>'
+                + ''.join(self.get_task_html({focus.name: focus for focus in per_task})) + '</div>')
+        return (report_page_start("Time Tracking Report", self.clock.now().strftime('%A, %B %d, %Y at %I:%M %p'), stats)
+                + body + REPORT_PAGE_END)
+        
+    def get_task_html(self, focus=None):
+        focus = focus or {}
+        task_html_parts = []
+        for i, task in enumerate(self.tasks):
+            samples = self.process_tracking.get(task['name'], [])
+            recent = sorted(samples, key=lambda p: p['timestamp'], reverse=True)[:5]
+            categories = category_shares(p.get('category') or self.classifier.classify(p['process']) for p in samples)
+            task_html_parts.append(render_task_html(
+                task['name'], task['minutes'], self.task_actual_seconds(i), i < self.current_task_index,
+                task.get('subtasks', []), [p['process'] for p in recent], self.resource_usage.get(task['name']), categories,
+                focus.get(task['name'])
+            ))
+        return task_html_parts
+
 
 # --- UI Classes ---
 class FloatingWidget(customtkinter.CTkToplevel):
@@ -95,42 +2365,36 @@ class FloatingWidget(customtkinter.CTkToplevel):
         
         self.x = 0
         self.y = 0
-        self.current_subtasks_cache = ""
-        self.current_task_name_cache = ""
+        self.current_subtasks_cache = None
+        self.current_task_index_cache = None
 
     def add_subtask(self):
         subtask_name = self.new_subtask_entry.get().strip()
-        if not subtask_name or not self.app.tasks:
+        if not subtask_name or not self.app.snapshot.tasks:
             return
             
-        task = self.app.tasks[self.app.current_task_index]
-        if 'subtasks' not in task:
-            task['subtasks'] = []
-            
-        task['subtasks'].append({'name': subtask_name, 'completed': False})
+        self.app.post(self.app.add_subtask, self.app.snapshot.current_task_index, subtask_name)
         self.new_subtask_entry.delete(0, 'end')
-        self.render_subtasks(task)
 
-    def render_subtasks(self, task):
+    def render_subtasks(self, task_index, subtasks):
         for widget in self.subtask_list_frame.winfo_children():
             widget.destroy()
 
-        if 'subtasks' not in task or not task['subtasks']:
+        if not subtasks:
             customtkinter.CTkLabel(
                 self.subtask_list_frame, text="No subtasks yet.", 
                 text_color='#a0aec0', font=('Arial', 9)
             ).pack(pady=10)
             return
 
-        for i, subtask in enumerate(task['subtasks']):
+        for i, (name, completed) in enumerate(subtasks):
             subtask_frame = customtkinter.CTkFrame(self.subtask_list_frame, fg_color='transparent')
             subtask_frame.pack(fill='x', anchor='w', pady=1)
 
             def toggle_subtask_handler(event=None, idx=i):
-                task['subtasks'][idx]['completed'] = not task['subtasks'][idx]['completed']
-                self.render_subtasks(task)
+                self.app.post(self.app.toggle_subtask, task_index, idx)
 
-            if subtask['completed']:
+            if completed:
                 checkmark_text = "✓"
                 fg_color = '#718096'
                 font_style = 'overstrike'
@@ -147,7 +2411,7 @@ class FloatingWidget(customtkinter.CTkToplevel):
             checkmark_label.bind("<Button-1>", toggle_subtask_handler)
             
             text_label = customtkinter.CTkLabel(
-                subtask_frame, text=subtask['name'], font=('Arial', 10, font_style),
+                subtask_frame, text=name, font=('Arial', 10, font_style),
                 text_color=fg_color, anchor='w', justify='left'
             )
             text_label.pack(side='left', fill='x', expand=True, padx=5)
@@ -157,14 +2421,13 @@ class FloatingWidget(customtkinter.CTkToplevel):
                 subtask_frame, text="✕", font=('Arial', 12),
                 fg_color='transparent', text_color='#c53030',
                 hover_color='#4a2a2a', width=20,
-                command=lambda idx=i: self.delete_subtask(task, idx)
+                command=lambda idx=i: self.delete_subtask(task_index, idx)
             )
             delete_btn.pack(side='right')
 
-    def delete_subtask(self, task, index):
+    def delete_subtask(self, task_index, index):
         if messagebox.askyesno("Confirm", "Delete this subtask?", parent=self):
-            task['subtasks'].pop(index)
-            self.render_subtasks(task)
+            self.app.post(self.app.delete_subtask, task_index, index)
         
     def start_move(self, event):
         self.x = event.x
@@ -182,20 +2445,21 @@ class FloatingWidget(customtkinter.CTkToplevel):
                             activebackground='#4fd1c5', activeforeground='white',
                             font=('Arial', 10))
 
-        if self.app.tasks:
-            for i, task in enumerate(self.app.tasks):
-                label = f"  {task['name']}"
-                if i == self.app.current_task_index:
-                    label = f"✓ {task['name']}"
+        snapshot = self.app.snapshot
+        if snapshot.tasks:
+            for i, task in enumerate(snapshot.tasks):
+                label = f"  {task.name}"
+                if i == snapshot.current_task_index:
+                    label = f"✓ {task.name}"
                 
                 task_menu.add_command(
                     label=label,
-                    command=lambda idx=i: self.app.switch_to_task(idx)
+                    command=lambda idx=i: self.app.post(self.app.switch_to_task, idx)
                 )
             task_menu.add_separator()
 
-        pause_label = "Resume" if not self.app.is_running else "Pause"
-        task_menu.add_command(label=pause_label, command=self.app.toggle_pause)
+        pause_label = "Resume" if not snapshot.is_running else "Pause"
+        task_menu.add_command(label=pause_label, command=lambda: self.app.post(self.app.toggle_pause))
         task_menu.add_command(label="Settings...", command=self.app.show_main_window)
         task_menu.add_separator()
         task_menu.add_command(label="Exit", command=self.app.quit_app)
@@ -205,9 +2469,10 @@ class FloatingWidget(customtkinter.CTkToplevel):
         finally:
             task_menu.grab_release()
 
-    def update_display(self, task, elapsed_seconds, is_running):
-        task_name = task['name']
-        planned_minutes = task['minutes']
+    def update_display(self, task_index, task, is_running, away=False):
+        task_name = task.name
+        planned_minutes = task.minutes
+        elapsed_seconds = task.actual_seconds
 
         self.task_label.configure(text=task_name[:30])
         
@@ -218,7 +2483,9 @@ class FloatingWidget(customtkinter.CTkToplevel):
         planned_seconds = planned_minutes * 60
         remaining = planned_seconds - elapsed_seconds
         
-        if remaining > 0:
+        if away:
+            self.remaining_label.configure(text="💤 Away - timer paused", text_color='#a0aec0')
+        elif remaining > 0:
             rem_min, rem_sec = divmod(remaining, 60)
             self.remaining_label.configure(
                 text=f"{int(rem_min)}m {int(rem_sec)}s left",
@@ -236,11 +2503,10 @@ class FloatingWidget(customtkinter.CTkToplevel):
         self.progress_bar.set(progress_percent)
         self.progress_bar.configure(progress_color='#fc8181' if remaining < 0 else '#4fd1c5')
         
-        subtasks_json = json.dumps(task.get('subtasks', []))
-        if task_name != self.current_task_name_cache or subtasks_json != self.current_subtasks_cache:
-            self.current_task_name_cache = task_name
-            self.current_subtasks_cache = subtasks_json
-            self.render_subtasks(task)
+        if task_index != self.current_task_index_cache or task.subtasks != self.current_subtasks_cache:
+            self.current_task_index_cache = task_index
+            self.current_subtasks_cache = task.subtasks
+            self.render_subtasks(task_index, task.subtasks)
 
 
 class SetupWindow(customtkinter.CTkToplevel):
@@ -261,7 +2527,7 @@ class SetupWindow(customtkinter.CTkToplevel):
         time_frame = customtkinter.CTkFrame(content, fg_color="transparent")
         time_frame.pack(fill='x', pady=(0, 5))
         
-        now = datetime.now()
+        now = self.app.clock.now()
         default_end = (now + timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
         h12 = default_end.hour % 12
         if h12 == 0: h12 = 12
@@ -292,6 +2558,7 @@ class SetupWindow(customtkinter.CTkToplevel):
         
         self.task_list_frame = customtkinter.CTkScrollableFrame(content)
         self.task_list_frame.pack(fill='both', expand=True)
+        self.estimator = TaskEstimator.from_db(self.app.db_path)
 
         customtkinter.CTkButton(content, text="+ Add Task", command=self._add_task_row).pack(pady=10)
         
@@ -306,8 +2573,14 @@ class SetupWindow(customtkinter.CTkToplevel):
 
         self.protocol("WM_DELETE_WINDOW", self.app.quit_app)
 
+    def reload_estimates(self):
+        """Read the estimates again, e.g. when the window is shown after another session was saved"""
+        self.estimator = TaskEstimator.from_db(self.app.db_path)
+        for row in self.task_list_frame.winfo_children():
+            row.update_hint()
+
     def _parse_time(self, time_str):
-        now = datetime.now()
+        now = self.app.clock.now()
         try:
             end = datetime.strptime(f"{now.date()} {time_str}", "%Y-%m-%d %I:%M %p")
             if end <= now:
@@ -320,7 +2593,7 @@ class SetupWindow(customtkinter.CTkToplevel):
         time_str = f"{self.hour_cb.get()}:{self.minute_cb.get()} {self.ampm_cb.get()}"
         end_time = self._parse_time(time_str)
         if end_time:
-            duration = end_time - datetime.now()
+            duration = end_time - self.app.clock.now()
             total_minutes = duration.total_seconds() / 60
             self.app.setup_session_minutes = total_minutes
             if total_minutes > 0:
@@ -339,7 +2612,7 @@ class SetupWindow(customtkinter.CTkToplevel):
         color = 'white' if remaining >= 0 else '#fc8181'
         self.remaining_time_label.configure(text=text, text_color=color)
 
-    def _add_task_row(self, name="", minutes="30"):
+    def _add_task_row(self, name="", minutes="30", from_template=False):
         row = customtkinter.CTkFrame(self.task_list_frame, fg_color="transparent")
         row.pack(fill='x', pady=2)
         
@@ -350,15 +2623,63 @@ class SetupWindow(customtkinter.CTkToplevel):
         minutes_entry = customtkinter.CTkEntry(row, width=70)
         minutes_entry.insert(0, minutes)
         minutes_entry.pack(side='left', padx=5)
-        minutes_entry.bind("<KeyRelease>", lambda e: self._update_total_task_minutes())
+
+        # Shown under the row while the name matches past tasks; clicking it takes the suggestion
+        hint_label = customtkinter.CTkLabel(row, text="", font=('Arial', 10), text_color='#a0aec0', anchor='w')
+        # Minutes typed by hand (or loaded from a template) are never overwritten by an estimate
+        state = {'minutes_edited': from_template, 'suggestion': None}
+
+        def set_minutes(value):
+            minutes_entry.delete(0, 'end')
+            minutes_entry.insert(0, str(value))
+            self._update_total_task_minutes()
+
+        def update_hint(event=None):
+            typed = name_entry.get()
+            exact = self.estimator.lookup(typed)
+            matches = self.estimator.suggest(typed)
+            state['suggestion'] = exact or (matches[0] if matches else None)
+            if not state['suggestion']:
+                hint_label.pack_forget()
+                return
+            if exact and not state['minutes_edited']:
+                set_minutes(suggested_minutes(exact))
+            hint_label.configure(text=self._format_estimate(state['suggestion'], len(matches)))
+            hint_label.pack(side='bottom', fill='x', padx=5, before=name_entry)
+
+        def take_suggestion(event=None):
+            estimate = state['suggestion']
+            if estimate:
+                name_entry.delete(0, 'end')
+                name_entry.insert(0, estimate.name)
+                set_minutes(suggested_minutes(estimate))
+                update_hint()
+
+        def minutes_typed(event=None):
+            state['minutes_edited'] = True
+            self._update_total_task_minutes()
+
+        name_entry.bind("<KeyRelease>", update_hint)
+        minutes_entry.bind("<KeyRelease>", minutes_typed)
+        hint_label.bind("<Button-1>", take_suggestion)
+        row.update_hint = update_hint
 
         def delete_row():
             row.destroy()
             self._update_total_task_minutes()
 
         customtkinter.CTkButton(row, text="✕", width=30, fg_color="#c53030", command=delete_row).pack(side='left', padx=5)
+        update_hint()
         self._update_total_task_minutes()
 
+    def _format_estimate(self, estimate, match_count):
+        text = (f"{estimate.name}: ~{suggested_minutes(estimate)} min "
+                f"(median {estimate.p50_seconds / 60:.0f}, 90% under {estimate.p90_seconds / 60:.0f}, "
+                f"{estimate.count} session{'s' if estimate.count != 1 else ''})")
+        if match_count > 1:
+            text += f" +{match_count - 1} more"
+        return text
+
     def _load_templates(self):
         templates = self.app.get_task_templates()
         if not templates:
@@ -369,7 +2690,7 @@ class SetupWindow(customtkinter.CTkToplevel):
             widget.destroy()
             
         for name, minutes in templates:
-            self._add_task_row(name=name, minutes=str(minutes))
+            self._add_task_row(name=name, minutes=str(minutes), from_template=True)
             
         self._update_total_task_minutes()
 
@@ -416,7 +2737,7 @@ class SetupWindow(customtkinter.CTkToplevel):
             messagebox.showerror("Error", "Invalid end time format. Use HH:MM AM/PM.")
             return
 
-        total_minutes = (end_time - datetime.now()).total_seconds() / 60
+        total_minutes = (end_time - self.app.clock.now()).total_seconds() / 60
         if total_minutes <= 0:
             messagebox.showerror("Error", "End time must be in the future!")
             return
@@ -446,7 +2767,7 @@ class ControlWindow(customtkinter.CTkToplevel):
         self.app = app
         
         self.title("Time Tracker Controls")
-        self.geometry("400x500")
+        self.geometry("400x560")
 
         customtkinter.CTkLabel(self, text="⚙️ Controls", font=('Arial', 24, 'bold')).pack(pady=20)
         
@@ -455,16 +2776,17 @@ class ControlWindow(customtkinter.CTkToplevel):
         
         customtkinter.CTkLabel(content, text="Switch to Task:").pack(anchor='w', pady=(0, 10))
         
-        for i, task in enumerate(self.app.tasks):
-            status = "✓" if i < self.app.current_task_index else "▶" if i == self.app.current_task_index else "⏳"
-            fg_color = '#38b2ac' if i == self.app.current_task_index else 'transparent'
+        snapshot = self.app.snapshot
+        for i, task in enumerate(snapshot.tasks):
+            status = "✓" if i < snapshot.current_task_index else "▶" if i == snapshot.current_task_index else "⏳"
+            fg_color = '#38b2ac' if i == snapshot.current_task_index else 'transparent'
             
             customtkinter.CTkButton(
                 content,
-                text=f"{status} {task['name']} ({task['minutes']} min)",
+                text=f"{status} {task.name} ({task.minutes} min)",
                 fg_color=fg_color,
                 anchor='w',
-                command=lambda idx=i: self.app.switch_to_task(idx)
+                command=lambda idx=i: self.app.post(self.app.switch_to_task, idx)
             ).pack(fill='x', pady=2)
             
         customtkinter.CTkLabel(content, text="Actions:").pack(anchor='w', pady=(20, 10))
@@ -482,6 +2804,25 @@ class ControlWindow(customtkinter.CTkToplevel):
         for text, command in actions:
             customtkinter.CTkButton(actions_frame, text=text, anchor='w', command=command).pack(fill='x', pady=2)
 
+        idle_frame = customtkinter.CTkFrame(content, fg_color="transparent")
+        idle_frame.pack(fill='x', pady=(10, 0))
+        customtkinter.CTkLabel(idle_frame, text="Auto-pause when idle for (min):").pack(side='left')
+        self.idle_entry = customtkinter.CTkEntry(idle_frame, width=60)
+        self.idle_entry.insert(0, str(self.app.idle_threshold_seconds // 60))
+        self.idle_entry.pack(side='left', padx=5)
+        self.idle_entry.bind("<Return>", lambda e: self._save_idle_threshold())
+        customtkinter.CTkButton(idle_frame, text="Save", width=60, command=self._save_idle_threshold).pack(side='left')
+
+    def _save_idle_threshold(self):
+        try:
+            minutes = int(self.idle_entry.get())
+        except ValueError:
+            minutes = 0
+        if minutes <= 0:
+            messagebox.showerror("Error", "Idle time must be a positive number of minutes", parent=self)
+            return
+        self.app.post(self.app.set_idle_threshold, minutes * 60)
+
 class HistoryWindow(customtkinter.CTkToplevel):
     def __init__(self, app):
         super().__init__(app.root)
@@ -495,12 +2836,11 @@ class HistoryWindow(customtkinter.CTkToplevel):
         
         content = customtkinter.CTkFrame(self, fg_color="transparent")
         content.pack(fill='both', expand=True, padx=20)
-        
-        reports = self._fetch_reports()
-        
-        if not reports:
-            customtkinter.CTkLabel(content, text="No reports found in history").pack(pady=50)
-            return
+
+        self.mode_selector = customtkinter.CTkSegmentedButton(
+            content, values=["Reports", "Per Day", "Focus"], command=lambda mode: self._show_mode(mode)
+        )
+        self.mode_selector.pack(anchor='w', pady=(0, 10))
         
         tree_frame = customtkinter.CTkFrame(content)
         tree_frame.pack(fill='both', expand=True)
@@ -517,52 +2857,158 @@ class HistoryWindow(customtkinter.CTkToplevel):
         
         self.tree = ttk.Treeview(
             tree_frame,
-            columns=('Date', 'Planned', 'Actual', 'Tasks', 'Start', 'End'),
             show='headings',
             yscrollcommand=scrollbar.set,
             selectmode="browse"
         )
-        
-        self.tree.heading('Date', text='Report Date')
-        self.tree.heading('Planned', text='Planned (min)')
-        self.tree.heading('Actual', text='Actual (min)')
-        self.tree.heading('Tasks', text='Tasks')
-        self.tree.heading('Start', text='Start Time')
-        self.tree.heading('End', text='End Time')
-        
-        for col in self.tree['columns']:
-            self.tree.column(col, width=100)
 
         scrollbar.configure(command=self.tree.yview)
-        
-        for report in reports:
-            report_id, report_date, planned, actual, tasks, created_at, start_time, end_time = report
-            start_display = datetime.fromisoformat(start_time).strftime('%I:%M %p') if start_time else 'N/A'
-            end_display = datetime.fromisoformat(end_time).strftime('%I:%M %p') if end_time else 'N/A'
-            self.tree.insert('', 'end', values=(report_date, f"{planned}", f"{actual:.1f}", tasks, start_display, end_display), tags=(report_id,))
-        
         self.tree.pack(fill='both', expand=True)
         
         button_frame = customtkinter.CTkFrame(content, fg_color="transparent")
         button_frame.pack(fill='x', pady=(10, 0))
         
-        customtkinter.CTkButton(button_frame, text="👁️ View Report", command=self._view_report).pack(side='left', padx=5)
-        customtkinter.CTkButton(button_frame, text="🗑️ Delete Report", command=self._delete_report, fg_color="#c53030").pack(side='left', padx=5)
+        self.view_button = customtkinter.CTkButton(button_frame, text="👁️ View Report", command=self._view_report)
+        self.view_button.pack(side='left', padx=5)
+        self.delete_button = customtkinter.CTkButton(button_frame, text="🗑️ Delete Report", command=self._delete_report, fg_color="#c53030")
+        self.delete_button.pack(side='left', padx=5)
+        self.older_button = customtkinter.CTkButton(button_frame, text="⏪ Older", width=80, command=self._load_older_reports)
+        self.older_button.pack(side='left', padx=5)
+        customtkinter.CTkButton(button_frame, text="🔍 Search", width=80, command=self._search_reports).pack(side='left', padx=5)
+        customtkinter.CTkButton(button_frame, text="🗂️ Batch Report", command=self._batch_report).pack(side='left', padx=5)
         customtkinter.CTkButton(button_frame, text="Close", command=self.destroy).pack(side='right', padx=5)
 
-    def _fetch_reports(self):
+        self.mode_selector.set("Reports")
+        self._show_mode("Reports")
+
+    def _set_columns(self, columns):
+        self.tree.delete(*self.tree.get_children())
+        self.tree['columns'] = [key for key, _ in columns]
+        for key, heading in columns:
+            self.tree.heading(key, text=heading)
+            self.tree.column(key, width=100)
+
+    def _show_mode(self, mode):
+        if mode == "Per Day":
+            self._show_daily_rollup()
+            report_buttons_state = 'disabled'
+        elif mode == "Focus":
+            self._show_focus()
+            report_buttons_state = 'disabled'
+        else:
+            self._show_reports()
+            report_buttons_state = 'normal'
+        self.view_button.configure(state=report_buttons_state)
+        self.delete_button.configure(state=report_buttons_state)
+        self.older_button.configure(state=report_buttons_state)
+
+    def _show_reports(self, reports=None):
+        self._set_columns([('Date', 'Report Date'), ('Planned', 'Planned (min)'), ('Actual', 'Actual (min)'),
+                           ('Tasks', 'Tasks'), ('Start', 'Start Time'), ('End', 'End Time')])
+        if reports is None:
+            # Start with the most recent page, which normally lives in the main database; older pages attach archives
+            conn = connect_db(self.db_path)
+            end_day = latest_report_day_before(conn, self.app.clock.now().date() + timedelta(days=1))
+            conn.close()
+            if end_day is None:
+                self.reports_start = self.app.clock.now().date()
+                return
+            self.reports_start = end_day - timedelta(days=HISTORY_PAGE_DAYS - 1)
+            reports = self._fetch_reports(self.reports_start, end_day)
+        self._insert_reports(reports)
+
+    def _insert_reports(self, reports):
+        for report in reports:
+            report_id, report_date, planned, actual, tasks, created_at, start_time, end_time = report
+            start_display = datetime.fromisoformat(start_time).strftime('%I:%M %p') if start_time else 'N/A'
+            end_display = datetime.fromisoformat(end_time).strftime('%I:%M %p') if end_time else 'N/A'
+            self.tree.insert('', 'end', values=(report_date, f"{planned}", f"{actual or 0:.1f}", tasks, start_display, end_display),
+                             tags=(report_id, report_date))
+
+    def _load_older_reports(self):
+        conn = connect_db(self.db_path)
+        end_day = latest_report_day_before(conn, self.reports_start)
+        conn.close()
+        if end_day is None:
+            messagebox.showinfo("Info", "No older reports", parent=self)
+            return
+        self.reports_start = end_day - timedelta(days=HISTORY_PAGE_DAYS - 1)
+        self._insert_reports(self._fetch_reports(self.reports_start, end_day))
+
+    def _search_reports(self):
+        text = simpledialog.askstring("Search", "Find sessions with a task or window title containing:", parent=self)
+        if not text or not text.strip():
+            return
+        conn = connect_db(self.db_path)
+        reports = search_reports(conn, text.strip())
+        conn.close()
+        self.mode_selector.set("Reports")
+        self._show_mode("Reports")
+        self.tree.delete(*self.tree.get_children())
+        self._insert_reports(reports)
+        if not reports:
+            messagebox.showinfo("Search", f"No sessions match '{text.strip()}'", parent=self)
+
+    def _show_daily_rollup(self):
+        self._set_columns([('Day', 'Day'), ('Planned', 'Planned (min)'), ('Actual', 'Actual (min)'),
+                           ('Sessions', 'Sessions'), ('Done', 'Tasks Done'), ('Categories', 'Top Windows')])
+        self.tree.column('Categories', width=220)
+
         conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT dr.id, dr.report_date, dr.total_planned_minutes, 
-                   dr.total_actual_minutes, dr.tasks_count, dr.created_at,
-                   s.start_time, s.end_time
-            FROM daily_reports dr
-            JOIN sessions s ON dr.session_id = s.id
-            ORDER BY dr.created_at DESC
-            LIMIT 50
-        ''')
-        reports = cursor.fetchall()
+        rows = conn.execute('''
+            SELECT day, planned_minutes, actual_seconds, session_count, tasks_completed, top_categories
+            FROM daily_rollup ORDER BY day DESC LIMIT 365
+        ''').fetchall()
+        conn.close()
+
+        for day, planned, actual_seconds, session_count, tasks_completed, top_categories in rows:
+            categories = ', '.join(name for name, _ in json.loads(top_categories or '[]'))
+            self.tree.insert('', 'end', values=(day, planned, f"{actual_seconds / 60:.1f}", session_count, tasks_completed, categories))
+
+    def _show_focus(self):
+        self._set_columns([('Task', 'Task'), ('Tracked', 'Tracked (h)'), ('Switches', 'Switches/h'), ('Dwell', 'Median Dwell (min)'),
+                           ('Unrelated', 'Unrelated'), ('Focus', 'Focus'), ('Histogram', 'Dwell Histogram')])
+        self.tree.column('Task', width=180)
+
+        end_day = self.app.clock.now().date()
+        conn = connect_db(self.db_path)
+        per_task, total = focus_stats(load_focus_samples(conn, end_day - timedelta(days=FOCUS_HISTORY_DAYS - 1), end_day))
+        conn.close()
+        if total is None:
+            return
+
+        total = total._replace(name=f"All tasks, last {FOCUS_HISTORY_DAYS} days")
+        for focus in [total] + sorted(per_task, key=lambda focus: focus.tracked_seconds, reverse=True):
+            self.tree.insert('', 'end', values=(focus.name, f"{focus.tracked_seconds / 3600:.1f}", f"{focus.switch_rate:.0f}",
+                                                f"{focus.median_dwell / 60:.1f}", f"{focus.unrelated_share:.0%}",
+                                                f"{focus.focus_score:.0%}", dwell_sparkline(focus.dwell_histogram)))
+
+    def _batch_report(self):
+        period = simpledialog.askstring(
+            "Batch Report", "Period: 'week', 'month' or YYYY-MM-DD:YYYY-MM-DD", initialvalue="week", parent=self
+        )
+        if not period:
+            return
+        try:
+            start_day, end_day = report_period(period.strip())
+        except ValueError:
+            messagebox.showerror("Error", "Invalid period", parent=self)
+            return
+
+        report_path = f"report_{start_day:%Y%m%d}_{end_day:%Y%m%d}.html"
+
+        def render():
+            try:
+                render_batch_report(self.db_path, start_day, end_day, report_path)
+                self.app.ui_call(webbrowser.open, f'file://{os.path.abspath(report_path)}')
+            except Exception as e:
+                self.app.ui_call(messagebox.showerror, "Error", f"Batch report failed: {e}")
+
+        threading.Thread(target=render, daemon=True).start()
+
+    def _fetch_reports(self, start_day, end_day):
+        conn = connect_db(self.db_path)
+        reports = fetch_reports(conn, start_day, end_day)
         conn.close()
         return reports
 
@@ -572,12 +3018,13 @@ class HistoryWindow(customtkinter.CTkToplevel):
             messagebox.showwarning("Warning", "Please select a report")
             return
         
-        report_id = self.tree.item(selection[0])['tags'][0]
+        report_id, report_date = self.tree.item(selection[0])['tags'][:2]
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT report_html, report_date FROM daily_reports WHERE id = ?', (report_id,))
-        result = cursor.fetchone()
+        conn = connect_db(self.db_path)
+        result = None
+        for schema in history_schemas(conn, report_date, report_date):
+            rows = conn.execute(f'SELECT report_html, report_date FROM {schema}.daily_reports WHERE id = ?', (report_id,)).fetchall()
+            result = result or (rows[0] if rows else None)
         conn.close()
         
         if result:
@@ -594,44 +3041,34 @@ class HistoryWindow(customtkinter.CTkToplevel):
             return
         
         if messagebox.askyesno("Confirm", "Delete selected report?"):
-            report_id = self.tree.item(selection[0])['tags'][0]
+            report_id, report_date = self.tree.item(selection[0])['tags'][:2]
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM daily_reports WHERE id = ?', (report_id,))
-            conn.commit()
+            conn = connect_db(self.db_path)
+            for schema in history_schemas(conn, report_date, report_date):
+                with conn:
+                    conn.execute(f'DELETE FROM {schema}.daily_reports WHERE id = ?', (report_id,))
             conn.close()
             
             self.tree.delete(selection[0])
             messagebox.showinfo("Success", "Report deleted")
 
 
-class TimeTrackerApp:
+class TimeTrackerApp(SessionTracker):
     def __init__(self):
         customtkinter.set_appearance_mode("dark")
         customtkinter.set_default_color_theme("blue")
 
         self.root = customtkinter.CTk()
         self.root.withdraw()
+
+        # Work handed to the Tk loop by the tray and tracking threads, drained in batches
+        self.ui_events = queue.SimpleQueue()
+
+        super().__init__("time_tracker.db", idle_source=create_idle_source())
         
-        self.db_path = "time_tracker.db"
-        self.init_database()
-        
-        self.total_minutes = 0
-        self.end_time = None
-        self.tasks = []
-        self.current_task_index = 0
-        self.is_running = False
-        self.elapsed_seconds = 0
-        self.session_start_time = None
-        self.session_id = None
-        self.process_tracking = {}
         self.setup_session_minutes = 0
         self.setup_total_task_minutes = 0
         
-        self.tracking_thread = None
-        self.stop_tracking_flag = False
-        
         self.floating_widget = None
         self.setup_window = None
         self.control_window = None
@@ -640,6 +3077,7 @@ class TimeTrackerApp:
         self.setup_tray_icon()
         
         self.root.after(100, self.show_setup_dialog)
+        self.root.after(UI_DRAIN_MS, self.process_ui_events)
         
     def setup_tray_icon(self):
         image = Image.new('RGB', (64, 64), color='#4fd1c5')
@@ -647,89 +3085,75 @@ class TimeTrackerApp:
         draw.rectangle([16, 16, 48, 48], fill='#2d3748')
         
         menu = pystray.Menu(
-            pystray.MenuItem('Show Timer', lambda: self.root.after(0, self.show_floating_widget)),
-            pystray.MenuItem('Hide Timer', lambda: self.root.after(0, self.hide_floating_widget)),
-            pystray.MenuItem('Settings', lambda: self.root.after(0, self.show_main_window)),
-            pystray.MenuItem('Report', lambda: self.root.after(0, self.generate_report)),
-            pystray.MenuItem('History', lambda: self.root.after(0, self.view_history)),
-            pystray.MenuItem('Exit', lambda: self.root.after(0, self.quit_app))
+            pystray.MenuItem('Show Timer', lambda: self.ui_call(self.show_floating_widget)),
+            pystray.MenuItem('Hide Timer', lambda: self.ui_call(self.hide_floating_widget)),
+            pystray.MenuItem('Settings', lambda: self.ui_call(self.show_main_window)),
+            pystray.MenuItem('Report', lambda: self.ui_call(self.generate_report)),
+            pystray.MenuItem('History', lambda: self.ui_call(self.view_history)),
+            pystray.MenuItem('Exit', lambda: self.ui_call(self.quit_app))
         )
         
         self.icon = pystray.Icon('TimeTracker', image, 'Time Tracker', menu)
         threading.Thread(target=self.icon.run, daemon=True).start()
         
-    def init_database(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''CREATE TABLE IF NOT EXISTS task_templates (id INTEGER PRIMARY KEY, name TEXT NOT NULL, default_minutes INTEGER NOT NULL)''')
-        cursor.execute('''CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY, total_minutes INTEGER, start_time TIMESTAMP, end_time TIMESTAMP)''')
-        cursor.execute('''CREATE TABLE IF NOT EXISTS session_tasks (id INTEGER PRIMARY KEY, session_id INTEGER, task_name TEXT, planned_minutes INTEGER, actual_seconds INTEGER, completed BOOLEAN, processes TEXT)''')
-        cursor.execute('''CREATE TABLE IF NOT EXISTS sub_tasks (id INTEGER PRIMARY KEY, session_task_id INTEGER, name TEXT, completed BOOLEAN)''')
-        cursor.execute('''CREATE TABLE IF NOT EXISTS daily_reports (id INTEGER PRIMARY KEY, session_id INTEGER, report_date DATE, report_html TEXT, total_planned_minutes INTEGER, total_actual_minutes INTEGER, tasks_count INTEGER)''')
-        
-        conn.commit()
-        conn.close()
-
     def show_setup_dialog(self):
         if self.setup_window is None or not self.setup_window.winfo_exists():
             self.setup_window = SetupWindow(self)
+        else:
+            # The window is reused; sessions saved since it was built change the estimates
+            self.setup_window.reload_estimates()
         self.setup_window.deiconify()
 
-    def start_session(self, tasks, total_minutes, end_time):
-        self.tasks = tasks
-        self.total_minutes = total_minutes
-        self.end_time = end_time
-        self.start_tracking()
+    def ui_call(self, func, *args):
+        """Run func(*args) on the Tk thread; safe to call from any thread"""
+        self.ui_events.put((func, args))
+
+    def process_ui_events(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self.ui_events.get_nowait())
+            except queue.Empty:
+                break
+        # A batch often holds many refreshes queued by ticks and commands; each distinct call runs once
+        for func, args in dict.fromkeys(batch):
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"UI event error: {e}")
+        self.root.after(UI_DRAIN_MS, self.process_ui_events)
 
-    def start_tracking(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('INSERT INTO sessions (total_minutes, start_time) VALUES (?, ?)', (self.total_minutes, datetime.now()))
-        self.session_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        self.current_task_index = 0
-        self.elapsed_seconds = 0
-        self.session_start_time = datetime.now()
-        self.is_running = True
-        
-        self.stop_tracking_flag = False
-        self.tracking_thread = threading.Thread(target=self.tracking_loop, daemon=True)
-        self.tracking_thread.start()
+    def start_session(self, tasks, total_minutes, end_time):
+        if self.tracking_thread:
+            # The previous loop was told to stop; wait for it so the new session has a single owner
+            self.tracking_thread.join()
+        super().start_session(tasks, total_minutes, end_time)
+        self.start_tracking_thread()
         
         self.show_floating_widget()
-        
-    def tracking_loop(self):
-        while not self.stop_tracking_flag:
-            if self.is_running:
-                self.elapsed_seconds += 1
-                
-                if self.elapsed_seconds % 10 == 0:
-                    self.track_active_process()
-                    
-                if self.floating_widget and self.floating_widget.winfo_exists():
-                    self.root.after(0, self.update_floating_widget)
-                    
-            time.sleep(1)
-            
-    def track_active_process(self):
-        try:
-            import pygetwindow as gw
-            active_window = gw.getActiveWindow()
-            if active_window and self.current_task_index < len(self.tasks):
-                task_name = self.tasks[self.current_task_index]['name']
-                if task_name not in self.process_tracking:
-                    self.process_tracking[task_name] = []
-                self.process_tracking[task_name].append({'process': active_window.title, 'timestamp': datetime.now().isoformat()})
-        except Exception as e:
-            print(f"Process tracking error: {e}")
+
+    def on_update(self):
+        self.ui_call(self.update_floating_widget)
+
+    def on_idle_return(self, task_index, idle_span, counted):
+        self.ui_call(self.ask_idle_span, task_index, idle_span, counted)
+
+    def ask_idle_span(self, task_index, idle_span, counted):
+        tasks = self.snapshot.tasks
+        if not (0 <= task_index < len(tasks)):
+            return
+        message = (
+            f"You were away for {idle_span // 60} min while working on "
+            f"'{tasks[task_index].name}'.\n\nKeep this time on the task?"
+        )
+        keep = messagebox.askyesno("Welcome back", message)
+        self.post(self.resolve_idle_span, task_index, idle_span, counted, keep)
             
     def update_floating_widget(self):
-        if self.current_task_index < len(self.tasks) and self.floating_widget and self.floating_widget.winfo_exists():
-            task = self.tasks[self.current_task_index]
-            self.floating_widget.update_display(task, self.elapsed_seconds, self.is_running)
+        snapshot = self.snapshot
+        if snapshot.current_task_index < len(snapshot.tasks) and self.floating_widget and self.floating_widget.winfo_exists():
+            task = snapshot.tasks[snapshot.current_task_index]
+            self.floating_widget.update_display(snapshot.current_task_index, task, snapshot.is_running, away=snapshot.away)
             
     def show_floating_widget(self):
         if not self.floating_widget or not self.floating_widget.winfo_exists():
@@ -740,20 +3164,6 @@ class TimeTrackerApp:
         if self.floating_widget and self.floating_widget.winfo_exists():
             self.floating_widget.withdraw()
             
-    def toggle_pause(self):
-        self.is_running = not self.is_running
-        
-    def switch_to_task(self, task_index):
-        if task_index == self.current_task_index or not (0 <= task_index < len(self.tasks)):
-            return
-            
-        if self.current_task_index < len(self.tasks):
-            self.tasks[self.current_task_index]['actual_seconds'] = self.elapsed_seconds
-            
-        self.current_task_index = task_index
-        self.elapsed_seconds = self.tasks[task_index].get('actual_seconds', 0)
-        self.update_floating_widget()
-        
     def show_main_window(self):
         if self.control_window is None or not self.control_window.winfo_exists():
             self.control_window = ControlWindow(self)
@@ -761,154 +3171,32 @@ class TimeTrackerApp:
             
     def new_session(self):
         if messagebox.askyesno("Confirm", "End current session and start new one?"):
-            self.stop_tracking_flag = True
+            self.post(self.stop_tracking)
+            if self.snapshot.session_id:
+                self.post(self.flush_session)
+                self.post(self.close_session).result()
             self.hide_floating_widget()
             self.show_setup_dialog()
             
     def end_session(self):
         if messagebox.askyesno("Confirm", "End current session?"):
             self.generate_report()
-            self.stop_tracking_flag = True
+            self.post(self.stop_tracking)
             self.hide_floating_widget()
-            
+            self.post(self.close_session).result()
+
     def generate_report(self):
-        if not self.session_id:
+        if not self.snapshot.session_id:
             messagebox.showwarning("Warning", "No active session")
             return
-            
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        total_actual_seconds = 0
-        for i, task in enumerate(self.tasks):
-            actual_seconds = self.elapsed_seconds if i == self.current_task_index else task.get('actual_seconds', 0)
-            total_actual_seconds += actual_seconds
-            processes = json.dumps(self.process_tracking.get(task['name'], []))
-            
-            cursor.execute('INSERT INTO session_tasks (session_id, task_name, planned_minutes, actual_seconds, completed, processes) VALUES (?, ?, ?, ?, ?, ?)',
-                           (self.session_id, task['name'], task['minutes'], actual_seconds, i <= self.current_task_index, processes))
-            
-            session_task_id = cursor.lastrowid
-            if 'subtasks' in task:
-                for subtask in task['subtasks']:
-                    cursor.execute('INSERT INTO sub_tasks (session_task_id, name, completed) VALUES (?, ?, ?)',
-                                   (session_task_id, subtask['name'], subtask['completed']))
-                  
-        cursor.execute('UPDATE sessions SET end_time = ? WHERE id = ?', (datetime.now(), self.session_id))
-        conn.commit()
-        
-        html_content = self.create_html_report_content()
-        total_actual_minutes = total_actual_seconds / 60
-        
-        cursor.execute('INSERT INTO daily_reports (session_id, report_date, report_html, total_planned_minutes, total_actual_minutes, tasks_count) VALUES (?, ?, ?, ?, ?, ?)',
-                       (self.session_id, datetime.now().date(), html_content, self.total_minutes, total_actual_minutes, len(self.tasks)))
-        
-        conn.commit()
-        conn.close()
+
+        html_content = self.post(self.save_report).result()
         
-        report_path = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
+        report_path = f"report_{self.clock.now().strftime('%Y%m%d_%H%M%S')}.html"
         with open(report_path, 'w', encoding='utf-8') as f: f.write(html_content)
             
         webbrowser.open(f'file://{os.path.abspath(report_path)}')
         messagebox.showinfo("Success", f"Report generated!\n{report_path}")
-        
-    def create_html_report_content(self):
-        # This method is long but is for generating a static HTML file. No need to refactor for now.
-        return f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <title>Time Tracking Report</title>
-    <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Arial, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            padding: 40px 20px;
-        }}
-        .container {{ max-width: 1000px; margin: 0 auto; }}
-        .header {{ background: white; padding: 40px; border-radius: 20px; margin-bottom: 30px; box-shadow: 0 20px 60px rgba(0,0,0,0.3); }}
-        .header h1 {{ font-size: 36px; color: #2d3748; margin-bottom: 10px; }}
-        .header .date {{ color: #718096; font-size: 16px; }}
-        .stats {{ display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 20px; margin-bottom: 30px; }}
-        .stat-card {{ background: white; padding: 30px; border-radius: 15px; box-shadow: 0 10px 30px rgba(0,0,0,0.2); }}
-        .stat-value {{ font-size: 48px; font-weight: bold; color: #667eea; margin-bottom: 10px; }}
-        .stat-label {{ color: #718096; font-size: 14px; text-transform: uppercase; letter-spacing: 1px; }}
-        .tasks-section {{ background: white; padding: 40px; border-radius: 20px; box-shadow: 0 20px 60px rgba(0,0,0,0.3); }}
-        .task-item {{ padding: 25px; border-bottom: 1px solid #e2e8f0; }}
-        .task-item:last-child {{ border-bottom: none; }}
-        .task-header {{ display: flex; justify-content: space-between; align-items: center; margin-bottom: 15px; }}
-        .task-name {{ font-size: 20px; font-weight: bold; color: #2d3748; }}
-        .task-status {{ padding: 6px 12px; border-radius: 20px; font-size: 12px; font-weight: bold; }}
-        .status-completed {{ background: #c6f6d5; color: #22543d; }}
-        .status-exceeded {{ background: #fed7d7; color: #742a2a; }}
-        .status-good {{ background: #bee3f8; color: #2c5282; }}
-        .task-times {{ display: flex; gap: 30px; margin-bottom: 15px; color: #4a5568; }}
-        .progress-bar {{ width: 100%; height: 12px; background: #e2e8f0; border-radius: 10px; overflow: hidden; margin-bottom: 15px; }}
-        .progress-fill {{ height: 100%; background: linear-gradient(90deg, #667eea, #764ba2); border-radius: 10px; }}
-        .progress-exceeded {{ background: linear-gradient(90deg, #fc8181, #f56565) !important; }}
-        .subtasks, .processes {{ background: #f7fafc; padding: 15px; border-radius: 10px; font-size: 13px; color: #4a5568; margin-top: 15px; }}
-        .subtasks-title, .processes-title {{ font-weight: bold; margin-bottom: 8px; color: #2d3748; }}
-        .subtask-item, .process-item {{ padding: 5px 0; border-bottom: 1px solid #e2e8f0; }}
-        .subtask-item:last-child, .process-item:last-child {{ border-bottom: none; }}
-        .subtask-item.completed {{ text-decoration: line-through; color: #a0aec0; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>⏱️ Time Tracking Report</h1>
-            <div class="date">{datetime.now().strftime('%A, %B %d, %Y at %I:%M %p')}</div>
-        </div>
-        <div class="stats">
-            <div class="stat-card"><div class="stat-value">{int(self.total_minutes)}</div><div class="stat-label">Planned Minutes</div></div>
-            <div class="stat-card"><div class="stat-value">{len(self.tasks)}</div><div class="stat-label">Total Tasks</div></div>
-            <div class="stat-card"><div class="stat-value">{self.current_task_index + 1}</div><div class="stat-label">Tasks Worked On</div></div>
-        </div>
-        <div class="tasks-section"><h2 style="margin-bottom: 30px; color: #2d3748;">Task Details</h2>
-        {''.join(self.get_task_html())}
-        </div>
-    </div>
-</body>
-</html>"""
-        
-    def get_task_html(self):
-        task_html_parts = []
-        for i, task in enumerate(self.tasks):
-            actual_seconds = self.elapsed_seconds if i == self.current_task_index else task.get('actual_seconds', 0)
-            actual_minutes = actual_seconds / 60
-            planned_minutes = task['minutes']
-            progress_percent = (actual_minutes / planned_minutes) * 100 if planned_minutes > 0 else 0
-            status = ('<span class="task-status status-completed">✓ Completed</span>' if i < self.current_task_index else 
-                      '<span class="task-status status-exceeded">⚠️ Exceeded</span>' if progress_percent > 100 else 
-                      '<span class="task-status status-good">✓ On Track</span>')
-            exceeded_class = 'progress-exceeded' if progress_percent > 100 else ''
-            
-            top_processes = sorted(self.process_tracking.get(task['name'], []), key=lambda p: p['timestamp'], reverse=True)[:5]
-            process_html = ""
-            if top_processes:
-                process_html = '<div class="processes"><div class="processes-title">🖥️ Active Windows:</div>' + ''.join([f'<div class="process-item">• {p["process"][:60]}</div>' for p in top_processes]) + '</div>'
-
-            subtasks = task.get('subtasks', [])
-            subtasks_html = ""
-            if subtasks:
-                completed_count = sum(1 for s in subtasks if s['completed'])
-                subtasks_html = f'<div class="subtasks"><div class="subtasks-title">Subtasks ({completed_count}/{len(subtasks)})</div>' + ''.join([f'<div class="subtask-item {"completed" if s["completed"] else ""}">{"✓" if s["completed"] else "○"} {s["name"]}</div>' for s in subtasks]) + '</div>'
-            
-            task_html_parts.append(f"""
-            <div class="task-item">
-                <div class="task-header"><div class="task-name">{task['name']}</div>{status}</div>
-                <div class="task-times">
-                    <div><strong>Planned:</strong> {planned_minutes:.0f} min</div>
-                    <div><strong>Actual:</strong> {actual_minutes:.1f} min</div>
-                    <div><strong>Difference:</strong> {actual_minutes - planned_minutes:+.1f} min</div>
-                </div>
-                <div class="progress-bar"><div class="progress-fill {exceeded_class}" style="width: {min(progress_percent, 100)}%"></div></div>
-                {subtasks_html}{process_html}
-            </div>""")
-        return task_html_parts
 
     def view_history(self):
         if self.history_window is None or not self.history_window.winfo_exists():
@@ -932,7 +3220,7 @@ class TimeTrackerApp:
         conn.close()
         
     def quit_app(self):
-        self.stop_tracking_flag = True
+        self.post(self.stop_tracking)
         if self.floating_widget: self.floating_widget.destroy()
         if self.setup_window: self.setup_window.destroy()
         if self.control_window: self.control_window.destroy()
@@ -944,6 +3232,55 @@ class TimeTrackerApp:
         self.root.mainloop()
 
 def main():
+    parser = argparse.ArgumentParser(description="Windows Time Tracker")
+    subparsers = parser.add_subparsers(dest='command')
+
+    report_parser = subparsers.add_parser('report', help="Render stored sessions for a period into one HTML report")
+    report_parser.add_argument('period', help="'week', 'month' or a range like 2026-01-01:2026-03-31")
+    report_parser.add_argument('--out', help="Output file (default: report_<start>_<end>.html)")
+    report_parser.add_argument('--workers', type=int, help="Worker processes (default: CPU count)")
+    report_parser.add_argument('--db', default="time_tracker.db", help="Database to read")
+
+    archive_parser = subparsers.add_parser('archive', help="Move old closed sessions into monthly archive databases")
+    archive_parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS, help="Archive whole months that ended at least this many days ago")
+    archive_parser.add_argument('--db', default="time_tracker.db", help="Database to archive from")
+
+    merge_parser = subparsers.add_parser('merge', help="Merge the history of other tracker databases into this one")
+    merge_parser.add_argument('sources', nargs='+', help="Databases to merge from, e.g. copies from other machines")
+    merge_parser.add_argument('--db', default="time_tracker.db", help="Database to merge into")
+
+    args = parser.parse_args()
+    if args.command == 'report':
+        try:
+            start_day, end_day = report_period(args.period)
+        except ValueError as e:
+            parser.error(f"invalid period {args.period!r}: {e}")
+        out_path = args.out or f"report_{start_day:%Y%m%d}_{end_day:%Y%m%d}.html"
+        init_database(args.db)
+        count = render_batch_report(args.db, start_day, end_day, out_path, workers=args.workers)
+        print(f"Rendered {count} sessions to {out_path}")
+        return
+    if args.command == 'archive':
+        init_database(args.db)
+        cutoff = archive_cutoff(datetime.now().date(), args.days)
+        moved = archive_sessions(args.db, cutoff)
+        print(f"Archived {moved} sessions")
+        conn = connect_db(args.db)
+        (still_open,) = conn.execute('SELECT COUNT(*) FROM sessions WHERE NOT closed AND start_time < ?', (cutoff,)).fetchone()
+        conn.close()
+        if still_open:
+            print(f"{still_open} older sessions are still open; they are archived after the app next starts")
+        return
+    if args.command == 'merge':
+        try:
+            merged, duplicates, still_open = merge_databases(args.db, args.sources)
+        except FileNotFoundError as e:
+            sys.exit(f"Nothing merged: {e}")
+        print(f"Merged {merged} sessions, skipped {duplicates} already present")
+        if still_open:
+            print(f"Skipped {still_open} open sessions; close the tracker on that machine and merge again to include them")
+        return
+
     app = TimeTrackerApp()
     app.run()
 